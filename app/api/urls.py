@@ -2,7 +2,9 @@ from django.urls import path,  get_resolver
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework_simplejwt.views import TokenRefreshView
-from user.views import RegisterView, LoginView, PasswordResetView, PasswordResetConfirmView, UserProfileView, UserSessionView, UserSessionDetailView, ChatSessionsView
+from user.async_views import ChatSessionsView
+from user.streaming import ChatStreamView
+from user.views import RegisterView, LoginView, PasswordResetView, PasswordResetConfirmView, UserProfileView, UserSessionView, UserSessionDetailView, SessionJobDetailView, SessionJobRetryView, SessionPageListView, UserSessionSearchView, KeywordListView, MetricsView
 
 @api_view(["GET"])
 def welcomeAPI(request):
@@ -33,6 +35,13 @@ urlpatterns = [
     path("profile/", UserProfileView.as_view(), name="user_profile"),
     path("user-sessions/", UserSessionView.as_view(), name="user-session-list"),
     path("user-sessions/create/", UserSessionView.as_view(), name="create-user-session"),
+    path("user-sessions/search/", UserSessionSearchView.as_view(), name="user-session-search"),
+    path("user-sessions/keywords/", KeywordListView.as_view(), name="user-session-keywords"),
     path("user-sessions/<int:pk>/", UserSessionDetailView.as_view(), name="user-session-detail"),
+    path("user-sessions/<int:pk>/pages/", SessionPageListView.as_view(), name="user-session-pages"),
+    path("user-sessions/jobs/<int:pk>/", SessionJobDetailView.as_view(), name="session-job-detail"),
+    path("user-sessions/jobs/<int:pk>/retry/", SessionJobRetryView.as_view(), name="session-job-retry"),
     path("user_sessions/<int:session_id>/chat-sessions/", ChatSessionsView.as_view(), name="chat-sessions-list"),
+    path("user_sessions/<int:session_id>/chat-sessions/stream/", ChatStreamView.as_view(), name="chat-sessions-stream"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
\ No newline at end of file
@@ -13,7 +13,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 from urllib.parse import parse_qsl
-from config.config import tmpPostgres
+from config.config import tmpPostgres, db_conn_max_age
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -111,6 +111,8 @@ DATABASES = {
         'HOST': tmpPostgres.hostname,
         'PORT': 5432,
         'OPTIONS': dict(parse_qsl(tmpPostgres.query)),
+        'CONN_MAX_AGE': db_conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
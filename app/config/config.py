@@ -10,8 +10,76 @@ azure_chatbot_endpoint = os.getenv("AZURE_AI_CHATBOT_ENDPOINT")
 azure_chatbot_access_key = os.getenv("AZURE_AI_CHATBOT_KEY")
 azure_chatbot_deployment_name = os.getenv("AZURE_AI_CHATBOT_DEPLOYMENT_NAME")
 azure_chatbot_api_version = os.getenv("AZURE_API_VERSION")
+azure_embedding_deployment_name = os.getenv("AZURE_AI_EMBEDDING_DEPLOYMENT_NAME")
 appwrite_api_key = os.getenv("APPWRITE_API_KEY")
 appwrite_endpoint = os.getenv("APPWRITE_ENDPOINT")
 appwrite_project_id = os.getenv("APPWRITE_PROJECT_ID")
 appwrite_bucket_id = os.getenv("APPWRITE_BUCKET_ID")
 tmpPostgres = urlparse(os.getenv("DATABASE_URL"))
+# Seconds a thread keeps its DB connection between uses (0 = close after every request).
+# Keep 0 under ASGI: run_blocking spreads DB work over the default executor's threads and
+# each would hold its own connection. Raise it only behind a pooler such as PgBouncer.
+db_conn_max_age = int(os.getenv("DB_CONN_MAX_AGE", "0"))
+ocr_max_workers = int(os.getenv("OCR_MAX_WORKERS", "8"))
+
+# Pages are downscaled to the vision model's useful resolution (page_max_*_side) anyway,
+# so rendering beyond ~150 dpi only costs CPU
+pdf_render_dpi = int(os.getenv("PDF_RENDER_DPI", "150"))
+page_grayscale = os.getenv("PAGE_GRAYSCALE", "true").lower() == "true"
+page_crop_margins = os.getenv("PAGE_CROP_MARGINS", "true").lower() == "true"
+page_max_long_side = int(os.getenv("PAGE_MAX_LONG_SIDE", "2048"))
+page_max_short_side = int(os.getenv("PAGE_MAX_SHORT_SIDE", "768"))
+page_jpeg_quality = int(os.getenv("PAGE_JPEG_QUALITY", "85"))
+page_jpeg_min_quality = int(os.getenv("PAGE_JPEG_MIN_QUALITY", "50"))
+page_jpeg_max_bytes = int(os.getenv("PAGE_JPEG_MAX_BYTES", str(200 * 1024)))
+pdf_max_bytes = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))
+pdf_download_timeout = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "300"))
+pdf_render_batch_size = int(os.getenv("PDF_RENDER_BATCH_SIZE", "4"))
+upload_max_workers = int(os.getenv("UPLOAD_MAX_WORKERS", "4"))
+session_job_workers = int(os.getenv("SESSION_JOB_WORKERS", "2"))
+session_jobs_in_process = os.getenv("SESSION_JOBS_IN_PROCESS", "true").lower() == "true"
+session_job_stale_seconds = int(os.getenv("SESSION_JOB_STALE_SECONDS", "1800"))
+ocr_cache_enabled = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+ocr_cache_local_max_bytes = int(os.getenv("OCR_CACHE_LOCAL_MAX_BYTES", str(16 * 1024 * 1024)))
+ocr_cache_db_max_bytes = int(os.getenv("OCR_CACHE_DB_MAX_BYTES", str(256 * 1024 * 1024)))
+retrieval_embedder = os.getenv("RETRIEVAL_EMBEDDER", "azure" if azure_embedding_deployment_name else "local")
+retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+retrieval_chunk_words = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "200"))
+retrieval_chunk_overlap = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "40"))
+http_connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+azure_http_timeout = float(os.getenv("AZURE_HTTP_TIMEOUT", "120"))
+azure_http_max_connections = int(os.getenv("AZURE_HTTP_MAX_CONNECTIONS", "50"))
+azure_http_max_keepalive = int(os.getenv("AZURE_HTTP_MAX_KEEPALIVE", "20"))
+appwrite_http_timeout = float(os.getenv("APPWRITE_HTTP_TIMEOUT", "60"))
+appwrite_http_pool_size = int(os.getenv("APPWRITE_HTTP_POOL_SIZE", "20"))
+chat_prompt_token_budget = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "6000"))
+chat_history_token_budget = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+chat_summary_max_tokens = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+chat_history_window = int(os.getenv("CHAT_HISTORY_WINDOW", "15"))
+answer_cache_enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+answer_cache_max_bytes = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+answer_cache_ttl = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+answer_cache_near_duplicates = os.getenv("ANSWER_CACHE_NEAR_DUPLICATES", "false").lower() == "true"
+answer_cache_similarity = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+transform_max_tokens = int(os.getenv("TRANSFORM_MAX_TOKENS", "4096"))
+# Documents over transform_chunk_tokens are transformed in page-aligned chunks in parallel
+transform_chunk_tokens = int(os.getenv("TRANSFORM_CHUNK_TOKENS", "3000"))
+transform_max_workers = int(os.getenv("TRANSFORM_MAX_WORKERS", "4"))
+transform_reconcile = os.getenv("TRANSFORM_RECONCILE", "false").lower() == "true"
+transform_cache_enabled = os.getenv("TRANSFORM_CACHE_ENABLED", "true").lower() == "true"
+transform_cache_local_max_bytes = int(os.getenv("TRANSFORM_CACHE_LOCAL_MAX_BYTES", str(8 * 1024 * 1024)))
+transform_cache_db_max_bytes = int(os.getenv("TRANSFORM_CACHE_DB_MAX_BYTES", str(64 * 1024 * 1024)))
+search_config = os.getenv("SEARCH_CONFIG", "english")
+# /api/metrics/ is disabled unless a scrape token is set
+metrics_token = os.getenv("METRICS_TOKEN")
+# Deployment quota (0 = unlimited). Calls are admitted through a token bucket shared by
+# all workers via the database ("db") or per process ("local"); "off" disables it.
+azure_tpm_limit = int(os.getenv("AZURE_TPM_LIMIT", "0"))
+azure_rpm_limit = int(os.getenv("AZURE_RPM_LIMIT", "0"))
+azure_rate_limit_backend = os.getenv("AZURE_RATE_LIMIT_BACKEND", "db")
+azure_rate_limit_burst_seconds = float(os.getenv("AZURE_RATE_LIMIT_BURST_SECONDS", "10"))
+azure_rate_limit_interactive_reserve = float(os.getenv("AZURE_RATE_LIMIT_INTERACTIVE_RESERVE", "0.2"))
+azure_max_retries = int(os.getenv("AZURE_MAX_RETRIES", "5"))
+azure_retry_base_delay = float(os.getenv("AZURE_RETRY_BASE_DELAY", "0.5"))
+azure_retry_max_delay = float(os.getenv("AZURE_RETRY_MAX_DELAY", "30"))
@@ -0,0 +1,240 @@
+import hashlib
+import re
+import time
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+from config.config import (
+    ocr_cache_enabled, ocr_cache_local_max_bytes, ocr_cache_db_max_bytes,
+    transform_cache_enabled, transform_cache_local_max_bytes, transform_cache_db_max_bytes,
+    answer_cache_enabled, answer_cache_max_bytes, answer_cache_ttl, answer_cache_near_duplicates, answer_cache_similarity,
+)
+from services.metrics import answer_cache_lookups, completion_cache_lookups
+
+
+class LRUCache:
+    def __init__(self, max_bytes: int, ttl: float = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self.current_bytes -= self._entries.pop(key)[1]
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size: int):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CompletionCache:
+    # Two tiers: a per-process LRU in front of the CachedCompletion table. The DB tier
+    # is trimmed back under max_db_bytes, least recently used first.
+    EVICTION_CHECK_INTERVAL = 50
+
+    def __init__(self, kind: str, max_local_bytes: int, max_db_bytes: int, enabled: bool = True):
+        self.kind = kind
+        self.enabled = enabled
+        self.max_db_bytes = max_db_bytes
+        self.local = LRUCache(max_local_bytes)
+        self.counters = {'local_hits': 0, 'db_hits': 0, 'misses': 0}
+        self._writes = 0
+        self._lock = Lock()
+
+    def make_key(self, *parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.local.get(key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+
+        from user.models import CachedCompletion
+
+        entry = CachedCompletion.objects.filter(key=key, kind=self.kind).values_list('value', 'size').first()
+        if entry is None:
+            self._count('misses')
+            return None
+
+        CachedCompletion.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        self._count('db_hits')
+        self.local.set(key, entry[0], entry[1])
+        return entry[0]
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+        completion_cache_lookups.inc(kind=self.kind, result=counter)
+
+    def set(self, key, value):
+        if not self.enabled or value is None:
+            return
+        from user.models import CachedCompletion
+
+        size = len(value.encode("utf-8"))
+        self.local.set(key, value, size)
+        try:
+            CachedCompletion.objects.update_or_create(
+                key=key,
+                defaults={'kind': self.kind, 'value': value, 'size': size, 'last_used_at': timezone.now()},
+            )
+        except IntegrityError:
+            # Another worker stored the same page concurrently
+            pass
+
+        with self._lock:
+            self._writes += 1
+            check_eviction = self._writes % self.EVICTION_CHECK_INTERVAL == 1
+        if check_eviction:
+            self.evict()
+
+    def evict(self):
+        from user.models import CachedCompletion
+
+        entries = CachedCompletion.objects.filter(kind=self.kind)
+        total = entries.aggregate(total=Sum('size'))['total'] or 0
+        excess = total - self.max_db_bytes
+        if excess <= 0:
+            return 0
+
+        stale_keys = []
+        for key, size in entries.order_by('last_used_at').values_list('key', 'size').iterator():
+            stale_keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        CachedCompletion.objects.filter(key__in=stale_keys).delete()
+        return len(stale_keys)
+
+
+class AnswerCache:
+    # Exact tier: (document hash, normalized query) -> answer, LRU with a TTL.
+    # Optional near-duplicate tier: per document bucket, the embeddings of recently
+    # answered queries, matched by cosine similarity.
+    MAX_NEAR_BUCKETS = 1024
+    MAX_NEAR_PER_BUCKET = 64
+
+    def __init__(self, max_bytes: int, ttl: float, near_duplicates: bool = False, similarity: float = 0.92, enabled: bool = True):
+        self.enabled = enabled
+        self.near_duplicates = near_duplicates
+        self.similarity = similarity
+        self.exact = LRUCache(max_bytes, ttl=ttl)
+        self.counters = {'exact_hits': 0, 'near_hits': 0, 'misses': 0}
+        self._near = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def normalize_query(query):
+        return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+    def _keys(self, document_hash, query):
+        bucket = document_hash
+        digest = hashlib.sha256(f"{bucket}\0{self.normalize_query(query)}".encode("utf-8")).hexdigest()
+        return bucket, digest
+
+    def _embed(self, query, embedder):
+        vector = embedder.embed([self.normalize_query(query)], call="embed_query")[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, document_hash, query, embedder=None):
+        if not self.enabled:
+            return None
+        bucket, key = self._keys(document_hash, query)
+        answer = self.exact.get(key)
+        if answer is not None:
+            self._count('exact_hits')
+            return answer
+
+        if self.near_duplicates and embedder:
+            answer = self._get_near(bucket, query, embedder)
+        self._count('near_hits' if answer is not None else 'misses')
+        return answer
+
+    def _get_near(self, bucket, query, embedder):
+        with self._lock:
+            entries = list(self._near.get(bucket, ()))
+        if not entries:
+            return None
+        scores = np.stack([vector for vector, _ in entries]) @ self._embed(query, embedder)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return self.exact.get(entries[best][1])
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+        answer_cache_lookups.inc(result=counter)
+
+    def set(self, document_hash, query, answer, embedder=None):
+        if not self.enabled or not answer:
+            return
+        bucket, key = self._keys(document_hash, query)
+        self.exact.set(key, answer, len(answer.encode("utf-8")))
+        if not (self.near_duplicates and embedder):
+            return
+
+        vector = self._embed(query, embedder)
+        with self._lock:
+            entries = self._near.pop(bucket, [])
+            entries = [entry for entry in entries if entry[1] != key][-(self.MAX_NEAR_PER_BUCKET - 1):]
+            entries.append((vector, key))
+            self._near[bucket] = entries
+            while len(self._near) > self.MAX_NEAR_BUCKETS:
+                self._near.popitem(last=False)
+
+    def stats(self):
+        return {
+            **self.counters,
+            'entries': len(self.exact),
+            'bytes': self.exact.current_bytes,
+        }
+
+
+ocr_cache = CompletionCache('ocr', ocr_cache_local_max_bytes, ocr_cache_db_max_bytes, enabled=ocr_cache_enabled)
+transform_cache = CompletionCache('transform', transform_cache_local_max_bytes, transform_cache_db_max_bytes, enabled=transform_cache_enabled)
+
+answer_cache = AnswerCache(
+    answer_cache_max_bytes,
+    answer_cache_ttl,
+    near_duplicates=answer_cache_near_duplicates,
+    similarity=answer_cache_similarity,
+    enabled=answer_cache_enabled,
+)
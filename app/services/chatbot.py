@@ -1,9 +1,37 @@
 import os
-import requests
 import base64
-from openai import AzureOpenAI
-from config.config import azure_chatbot_access_key, azure_chatbot_endpoint, azure_chatbot_deployment_name, azure_chatbot_api_version
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.clients import get_async_azure_openai_client, get_azure_openai_client, get_http_session, run_blocking
+from config.config import azure_chatbot_access_key, azure_chatbot_endpoint, azure_chatbot_deployment_name, azure_chatbot_api_version, appwrite_http_timeout, transform_max_tokens, transform_chunk_tokens, transform_max_workers, transform_reconcile
 from typing import Any
+from services.cache import ocr_cache, transform_cache
+from services.prompting import count_tokens, split_pages
+from services.metrics import model_call_errors, model_call_seconds, record_usage
+from services.scheduler import arun_with_quota, estimate_tokens, run_with_quota
+
+
+# Bump OCR_PROMPT_VERSION (TRANSFORM_PROMPT_VERSION) whenever the OCR (transform)
+# request changes in a way that should invalidate previously cached output.
+OCR_PROMPT_VERSION = "1"
+TRANSFORM_PROMPT_VERSION = "1"
+OCR_PROMPT = (
+    "Analyze this handwritten notebook image. "
+    "Only describe visible and clearly verifiable elements: text, formulas, equations, tables. "
+    "If any diagram or graph is NOT explicitly shown, do NOT mention it. "
+    "Avoid making assumptions. Do not organize the content into 'Left Page' and 'Right Page' structure if applicable. "
+    "Preserve mathematical formatting and table structure accurately."
+)
+
+
+class PageOCRError(Exception):
+    def __init__(self, failures: dict):
+        # failures maps 1-based page numbers to the error raised for that page
+        self.failures = failures
+        pages = ", ".join(str(page) for page in sorted(failures))
+        super().__init__(f"OCR failed for page(s) {pages}.")
+
 
 class AzureChatbot:
     def __init__(self):
@@ -11,28 +39,53 @@ class AzureChatbot:
         self.subscription_key = f"{azure_chatbot_access_key}"
         self.api_version = f"{azure_chatbot_api_version}"
         self.model = f'{azure_chatbot_deployment_name}'
-        self.client = AzureOpenAI(
-            api_version=self.api_version,
-            azure_endpoint=self.endpoint,
-            api_key=self.subscription_key,
-        )
+        self.client = get_azure_openai_client()
 
-    def image_to_text(self, public_image_url: str = None):
-        if not public_image_url:
-            raise ValueError("Public image URL must be provided.")
-        
-        img_byte = requests.get(public_image_url).content
-        img_base64 = base64.b64encode(img_byte).decode("utf-8")
+    @property
+    def async_client(self):
+        # Bound to the running event loop, so resolved on use rather than in __init__
+        return get_async_azure_openai_client()
 
-        strict_prompt = (
-            "Analyze this handwritten notebook image. "
-            "Only describe visible and clearly verifiable elements: text, formulas, equations, tables. "
-            "If any diagram or graph is NOT explicitly shown, do NOT mention it. "
-            "Avoid making assumptions. Do not organize the content into 'Left Page' and 'Right Page' structure if applicable. "
-            "Preserve mathematical formatting and table structure accurately."
-        )
+    def _create(self, call: str, kwargs: dict):
+        # Every completion goes through here so latency, failures and token usage are
+        # recorded per call type
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(**kwargs)
+        except Exception:
+            model_call_errors.inc(call=call, model=self.model)
+            raise
+        finally:
+            model_call_seconds.observe(time.perf_counter() - started, call=call, model=self.model)
+        # A stream's usage only arrives with its last chunk; the caller records it
+        if not kwargs.get("stream"):
+            record_usage(call, self.model, response)
+        return response
+
+    async def _acreate(self, call: str, kwargs: dict):
+        started = time.perf_counter()
+        try:
+            response = await self.async_client.chat.completions.create(**kwargs)
+        except Exception:
+            model_call_errors.inc(call=call, model=self.model)
+            raise
+        finally:
+            model_call_seconds.observe(time.perf_counter() - started, call=call, model=self.model)
+        if not kwargs.get("stream"):
+            record_usage(call, self.model, response)
+        return response
+
+    def _complete(self, call: str, **kwargs):
+        return run_with_quota(self.model, call, estimate_tokens(kwargs), lambda: self._create(call, kwargs))
+
+    async def _acomplete(self, call: str, **kwargs):
+        return await arun_with_quota(self.model, call, estimate_tokens(kwargs), lambda: self._acreate(call, kwargs))
 
-        response = self.client.chat.completions.create(
+    def _ocr_request(self, img_byte: bytes):
+        img_base64 = base64.b64encode(img_byte).decode("utf-8")
+        strict_prompt = OCR_PROMPT
+
+        return dict(
             model=self.model,
             messages=[
                 {
@@ -52,36 +105,95 @@ class AzureChatbot:
             temperature=0.3,
             top_p=1.0,
         )
-        return response.choices[0].message.content
-        
 
-    def rag_chatbot(self, user_query: str, context_doc: Any,
-                    max_tokens: int = 4096, temperature: float = 1.0, top_p: float = 1.0,
-                    prev_chat_context=None):
-        response = self.client.chat.completions.create(
-           messages = [
-                        {
-                            "role": "system",
-                            "content": (
-                                f"You are a helpful and concise assistant. Answer the user's queries using only the information provided in the following document:\n\n{context_doc}\n\n"
-                                f"Also, take into account the relevant context from the previous conversation:\n\n{prev_chat_context}\n\n"
-                                "If the answer cannot be found in the document or prior context, respond with 'I don't have enough information to answer that.'"
-                            )
-                        },
-                        {
-                            "role": "user",
-                            "content": user_query
-                        }
-                    ],
+    def image_to_text(self, public_image_url: str = None, image_bytes: Any = None):
+        if image_bytes is None and not public_image_url:
+            raise ValueError("Public image URL or image bytes must be provided.")
+
+        if image_bytes is None:
+            img_byte = get_http_session().get(public_image_url, timeout=appwrite_http_timeout).content
+        elif hasattr(image_bytes, "read"):
+            image_bytes.seek(0)
+            img_byte = image_bytes.read()
+        else:
+            img_byte = bytes(image_bytes)
+        # Identical page bytes under the same prompt and deployment are OCR'd only once
+        cache_key = ocr_cache.make_key(OCR_PROMPT_VERSION, self.model, OCR_PROMPT, img_byte)
+        cached_text = ocr_cache.get(cache_key)
+        if cached_text is not None:
+            return cached_text
+
+        response = self._complete("ocr", **self._ocr_request(img_byte))
+        ocr_text = response.choices[0].message.content
+        ocr_cache.set(cache_key, ocr_text)
+        return ocr_text
+
+    async def aimage_to_text(self, image_bytes: bytes):
+        cache_key = ocr_cache.make_key(OCR_PROMPT_VERSION, self.model, OCR_PROMPT, image_bytes)
+        # The cache may hit the DB, which Django only allows from sync code
+        cached_text = await run_blocking(ocr_cache.get, cache_key)
+        if cached_text is not None:
+            return cached_text
+
+        response = await self._acomplete("ocr", **self._ocr_request(image_bytes))
+        ocr_text = response.choices[0].message.content
+        await run_blocking(ocr_cache.set, cache_key, ocr_text)
+        return ocr_text
+
+    def _rag_messages(self, user_query: str, context_doc: Any, prev_chat_context=None):
+        return [
+            {
+                "role": "system",
+                "content": (
+                    f"You are a helpful and concise assistant. Answer the user's queries using only the information provided in the following document:\n\n{context_doc}\n\n"
+                    f"Also, take into account the relevant context from the previous conversation:\n\n{prev_chat_context}\n\n"
+                    "If the answer cannot be found in the document or prior context, respond with 'I don't have enough information to answer that.'"
+                )
+            },
+            {
+                "role": "user",
+                "content": user_query
+            }
+        ]
+
+    def _rag_request(self, user_query, context_doc, prev_chat_context, max_tokens, temperature, top_p):
+        return dict(
+            messages=self._rag_messages(user_query, context_doc, prev_chat_context),
             max_tokens=max_tokens,
             temperature=temperature,
             top_p=top_p,
             model=self.model
         )
+
+    async def arag_chatbot(self, user_query: str, context_doc: Any,
+                           max_tokens: int = 4096, temperature: float = 1.0, top_p: float = 1.0,
+                           prev_chat_context=None):
+        response = await self._acomplete("chat", **self._rag_request(user_query, context_doc, prev_chat_context, max_tokens, temperature, top_p))
         return response.choices[0].message.content
-    
-    def transform_document(self, document_text: Any, specifactions: Any):
-        response = self.client.chat.completions.create(
+
+    async def arag_chatbot_stream(self, user_query: str, context_doc: Any,
+                                  max_tokens: int = 4096, temperature: float = 1.0, top_p: float = 1.0,
+                                  prev_chat_context=None):
+        stream = await self._acomplete("chat_stream", stream=True, stream_options={"include_usage": True},
+                                       **self._rag_request(user_query, context_doc, prev_chat_context, max_tokens, temperature, top_p))
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    record_usage("chat_stream", self.model, chunk)
+        finally:
+            await stream.close()
+
+    def _transform_request(self, document_text: str, specifactions: Any, max_tokens: int, part: tuple = None):
+        instruction = "Please transform the document below according to the specifications provided."
+        if part:
+            instruction = (
+                f"Below is part {part[0]} of {part[1]} of a longer document, split at page boundaries. "
+                "Transform only this part according to the specifications provided; do not add an introduction "
+                "or conclusion for the document as a whole."
+            )
+        return dict(
             messages = [
                         {
                             "role": "system",
@@ -93,20 +205,111 @@ class AzureChatbot:
                         {
                             "role": "user",
                             "content": (
-                                f"Please transform the document below according to the specifications provided.\n\n"
+                                f"{instruction}\n\n"
                                 f"Document Text:\n{document_text}"
                             )
                         }
                     ],
+            max_tokens=max_tokens,
             temperature=0.7,
             top_p=1.0,
             model=self.model
         )
-        document = response.choices[0].message.content
+
+    def _reconcile_request(self, document_text: str, specifactions: Any, max_tokens: int):
+        return dict(
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        f"You are a precise editor. The document below was transformed in parts according to these specifications:\n\n{specifactions}\n\n"
+                        "Join the parts into one consistent document: merge repeated headings, align terminology and numbering, "
+                        "and smooth the transitions between parts. Do not summarize or drop content, and keep tables and numerical data exactly as they are."
+                    )
+                },
+                {"role": "user", "content": document_text},
+            ],
+            max_tokens=max_tokens,
+            temperature=0.3,
+            top_p=1.0,
+            model=self.model
+        )
+
+    def _cached_transform(self, call: str, request: dict, *key_parts):
+        # Memoized on the source text and the specification, so re-applying a spec the
+        # session (or another session over the same text) already had costs nothing
+        cache_key = transform_cache.make_key(TRANSFORM_PROMPT_VERSION, self.model, call, *key_parts)
+        cached_document = transform_cache.get(cache_key)
+        if cached_document is not None:
+            return cached_document
+        document = self._complete(call, **request).choices[0].message.content
+        transform_cache.set(cache_key, document)
+        return document
+
+    def transform_document(self, document_text: Any, specifactions: Any, max_tokens: int = None, reconcile: bool = None):
+        # document_text is a list of page texts or one string (split by line). Documents over
+        # transform_chunk_tokens are transformed in page-aligned chunks concurrently and
+        # stitched back in order, optionally followed by a reconciliation pass.
+        if isinstance(document_text, (list, tuple)):
+            pages = [str(page) for page in document_text]
+        else:
+            pages = str(document_text or "").splitlines()
+        max_tokens = max_tokens or transform_max_tokens
+        spec_key = json.dumps(specifactions, sort_keys=True, default=str)
+
+        chunks = split_pages(pages, transform_chunk_tokens)
+        if len(chunks) <= 1:
+            text = "\n".join(pages)
+            return self._cached_transform("transform", self._transform_request(text, specifactions, max_tokens),
+                                          max_tokens, text, spec_key)
+
+        def transform_chunk(index):
+            text, part = "\n".join(chunks[index]), (index + 1, len(chunks))
+            return self._cached_transform("transform", self._transform_request(text, specifactions, max_tokens, part),
+                                          max_tokens, text, spec_key, *part)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(transform_max_workers, len(chunks)))) as executor:
+            document = "\n\n".join(executor.map(transform_chunk, range(len(chunks))))
+
+        reconcile = transform_reconcile if reconcile is None else reconcile
+        # The reconciled document has to come back in one completion, so it is skipped
+        # when the stitched result would not fit max_tokens
+        if reconcile and count_tokens(document) <= max_tokens:
+            document = self._cached_transform("transform_reconcile", self._reconcile_request(document, specifactions, max_tokens),
+                                              max_tokens, document, spec_key)
         return document
     
+    def _summary_request(self, previous_summary: str, turns: list, max_tokens: int):
+        transcript = "\n\n".join(f"User: {turn['user_query']}\nAssistant: {turn['response'] or ''}" for turn in turns)
+        return dict(
+            messages = [
+                            {
+                                "role": "system",
+                                "content": (
+                                    "You maintain a running summary of a conversation between a student and an assistant about a document. "
+                                    "Update the existing summary with the new turns. Keep facts, definitions, open questions and user preferences; drop pleasantries. "
+                                    f"Respond with the updated summary only, in at most {max_tokens} tokens."
+                                )
+                            },
+                            {
+                                "role": "user",
+                                "content": (
+                                    f"Existing summary:\n{previous_summary or 'None'}\n\nNew turns:\n{transcript}"
+                                )
+                            }
+                        ],
+            max_tokens=max_tokens,
+            temperature=0.3,
+            top_p=1.0,
+            model=self.model
+        )
+
+    async def asummarize_conversation(self, previous_summary: str, turns: list, max_tokens: int = 300):
+        response = await self._acomplete("summarize", **self._summary_request(previous_summary, turns, max_tokens))
+        return response.choices[0].message.content.strip()
+
     def create_session_name(self, final_documnt: Any):
-        response = self.client.chat.completions.create(
+        response = self._complete("session_name",
             messages = [
                             {
                                 "role": "system",
@@ -129,7 +332,7 @@ class AzureChatbot:
         return session_name
     
     def keywords_extraction(self, document_text: Any):
-        response = self.client.chat.completions.create(
+        response = self._complete("keywords",
             messages = [
                             {
                                 "role": "system",
@@ -153,6 +356,41 @@ class AzureChatbot:
         keywords = response.choices[0].message.content.strip()
         return keywords
 
+    def describe_document(self, document_text: Any):
+        # Session name and keywords from one JSON-mode completion instead of two round trips
+        response = self._complete("describe",
+            messages = [
+                            {
+                                "role": "system",
+                                "content": (
+                                    "You are a creative, precise and helpful assistant. For the provided document, generate a unique, concise session name "
+                                    "(maximum 100 characters) that represents its core idea, and extract its most relevant keywords: nouns, noun phrases, "
+                                    "technical terms and key concepts, avoiding generic or overly common words. "
+                                    'Respond with a JSON object of the form {"session_name": "...", "keywords": ["...", "..."]}.'
+                                )
+                            },
+                            {
+                                "role": "user",
+                                "content": f"Document content:\n\n{document_text}"
+                            }
+                        ],
+            response_format={"type": "json_object"},
+            max_tokens=300,
+            temperature=0.7,
+            top_p=1.0,
+            model=self.model
+        )
+        try:
+            description = json.loads(response.choices[0].message.content)
+            session_name = str(description["session_name"]).strip()[:225]
+            keywords = description.get("keywords") or []
+        except (TypeError, ValueError, KeyError):
+            return self.create_session_name(document_text), self.keywords_extraction(document_text)
+
+        if isinstance(keywords, list):
+            keywords = ", ".join(str(keyword).strip() for keyword in keywords if str(keyword).strip())
+        return session_name, str(keywords).strip()
+
 # if __name__ == "__main__":
 
 #     bot = AzureChatbot()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import weakref
+import httpx
+import requests
+from threading import Lock
+from appwrite.client import Client
+from django.db import close_old_connections
+from openai import AsyncAzureOpenAI, AzureOpenAI
+from requests.adapters import HTTPAdapter
+from config.config import (
+    azure_chatbot_access_key, azure_chatbot_endpoint, azure_chatbot_api_version,
+    appwrite_api_key, appwrite_endpoint, appwrite_project_id,
+    http_connect_timeout, http_keepalive_expiry,
+    azure_http_timeout, azure_http_max_connections, azure_http_max_keepalive,
+    appwrite_http_pool_size,
+)
+
+# Process-wide clients, built lazily on first use and shared by every request in the
+# worker so keep-alive connections (and their TLS sessions) are reused between calls.
+_clients = {}
+_clients_pid = os.getpid()
+_lock = Lock()
+# Async clients are bound to the event loop that created them: one set per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_or_create(name, factory):
+    global _clients_pid
+    client = _clients.get(name)
+    if client is not None and _clients_pid == os.getpid():
+        return client
+    with _lock:
+        # Sockets must not be shared with a forked parent (e.g. gunicorn --preload)
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def _get_or_create_async(name, factory):
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if name not in clients:
+        clients[name] = factory()
+    return clients[name]
+
+
+def _azure_limits():
+    return httpx.Limits(
+        max_connections=azure_http_max_connections,
+        max_keepalive_connections=azure_http_max_keepalive,
+        keepalive_expiry=http_keepalive_expiry,
+    )
+
+
+def _build_azure_openai_client():
+    http_client = httpx.Client(
+        limits=_azure_limits(),
+        timeout=httpx.Timeout(azure_http_timeout, connect=http_connect_timeout),
+    )
+    return AzureOpenAI(
+        api_version=f"{azure_chatbot_api_version}",
+        azure_endpoint=f"{azure_chatbot_endpoint}",
+        api_key=f"{azure_chatbot_access_key}",
+        http_client=http_client,
+        # Retries happen in services.scheduler.run_with_quota, which waits out the quota between attempts
+        max_retries=0,
+    )
+
+
+def _build_async_azure_openai_client():
+    http_client = httpx.AsyncClient(
+        limits=_azure_limits(),
+        timeout=httpx.Timeout(azure_http_timeout, connect=http_connect_timeout),
+    )
+    return AsyncAzureOpenAI(
+        api_version=f"{azure_chatbot_api_version}",
+        azure_endpoint=f"{azure_chatbot_endpoint}",
+        api_key=f"{azure_chatbot_access_key}",
+        http_client=http_client,
+        # Retries happen in services.scheduler.run_with_quota, which waits out the quota between attempts
+        max_retries=0,
+    )
+
+
+def _build_async_http_client():
+    limits = httpx.Limits(
+        max_connections=appwrite_http_pool_size,
+        max_keepalive_connections=appwrite_http_pool_size,
+        keepalive_expiry=http_keepalive_expiry,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(appwrite_http_timeout, connect=http_connect_timeout))
+
+
+def _build_appwrite_client():
+    client = Client()
+    client.set_endpoint(appwrite_endpoint).set_project(appwrite_project_id).set_key(appwrite_api_key)
+    return client
+
+
+def _build_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=appwrite_http_pool_size, pool_maxsize=appwrite_http_pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_azure_openai_client():
+    return _get_or_create("azure_openai", _build_azure_openai_client)
+
+
+def get_appwrite_client():
+    return _get_or_create("appwrite", _build_appwrite_client)
+
+
+def get_http_session():
+    # Used for Appwrite uploads and PDF/image downloads; the Appwrite SDK itself calls
+    # requests.request per call and cannot reuse connections.
+    return _get_or_create("http_session", _build_http_session)
+
+
+def get_async_azure_openai_client():
+    return _get_or_create_async("azure_openai", _build_async_azure_openai_client)
+
+
+def get_async_http_client():
+    # Async counterpart of get_http_session for Appwrite uploads and PDF downloads
+    return _get_or_create_async("http", _build_async_http_client)
+
+
+async def aclose_async_clients():
+    # For short-lived loops (asyncio.run in a job thread); the ASGI loop keeps its clients
+    for client in _async_clients.pop(asyncio.get_running_loop(), {}).values():
+        # AsyncAzureOpenAI exposes close(), httpx.AsyncClient aclose(); both are coroutines
+        await (client.aclose() if hasattr(client, "aclose") else client.close())
+
+
+async def run_blocking(fn, *args, **kwargs):
+    # Runs blocking (possibly DB-touching) code off the event loop. Like a request
+    # boundary, each call ends by closing the thread's DB connection once it is past
+    # CONN_MAX_AGE (immediately by default) or unusable.
+    def call():
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return await asyncio.to_thread(call)
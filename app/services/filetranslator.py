@@ -1,19 +1,90 @@
+import asyncio
 import os
-import requests
-from appwrite.client import Client
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from appwrite.exception import AppwriteException
 from appwrite.input_file import InputFile
 from appwrite.services.storage import Storage
-from config.config import appwrite_api_key, appwrite_endpoint, appwrite_project_id, appwrite_bucket_id
-from pdf2image import convert_from_bytes
+from config.config import appwrite_api_key, appwrite_endpoint, appwrite_project_id, appwrite_bucket_id, pdf_render_dpi, pdf_render_batch_size, pdf_max_bytes, pdf_download_timeout, http_connect_timeout, appwrite_http_timeout
+from services.clients import get_appwrite_client, get_async_http_client, get_http_session
+from services.imaging import encode_page
+from services.metrics import time_stage
+from pdf2image import convert_from_path, pdfinfo_from_path
 from urllib.parse import urlparse
-from io import BytesIO
+
+
+# Appwrite accepts single-request uploads below its 5MB chunk size
+APPWRITE_SINGLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class PDFDownloadError(ValueError):
+    pass
+
+
+def check_pdf_response(status_code, headers):
+    # Runs on the response headers, before any of the body is read
+    if status_code >= 400:
+        raise PDFDownloadError(f"PDF download failed with HTTP {status_code}.")
+    if (headers.get("Content-Type") or "").split(";")[0].strip().lower() != "application/pdf":
+        raise PDFDownloadError("Invalid content type, expected PDF.")
+    content_length = headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > pdf_max_bytes:
+        raise PDFDownloadError(f"PDF is larger than the {pdf_max_bytes} byte limit.")
+
+
+class PDFWriter:
+    # Copies downloaded chunks into a file, enforcing the size cap (servers may omit or
+    # understate Content-Length) and an overall deadline on top of the per-read timeouts
+    def __init__(self, file):
+        self.file = file
+        self.size = 0
+        self.deadline = time.monotonic() + pdf_download_timeout
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > pdf_max_bytes:
+            raise PDFDownloadError(f"PDF is larger than the {pdf_max_bytes} byte limit.")
+        if time.monotonic() > self.deadline:
+            raise PDFDownloadError(f"PDF download took longer than {pdf_download_timeout:g}s.")
+        self.file.write(chunk)
+
+    def finish(self):
+        self.file.flush()
+        self.file.seek(0)
+        signature = self.file.read(5)
+        self.file.seek(0, os.SEEK_END)
+        if signature != b"%PDF-":
+            raise PDFDownloadError("Downloaded file is not a PDF.")
+
+
+def page_batches(page_count: int, batch_size: int, skip_pages=()):
+    # (first_page, last_page) runs of consecutive pages not in skip_pages, at most batch_size long
+    batches = []
+    for page in range(1, page_count + 1):
+        if page in skip_pages:
+            continue
+        if batches and page == batches[-1][1] + 1 and page - batches[-1][0] < batch_size:
+            batches[-1][1] = page
+        else:
+            batches.append([page, page])
+    return [tuple(batch) for batch in batches]
 
 
 class FileTranslator:
     def __init__(self):
-        self.client = Client()
-        self.client.set_endpoint(appwrite_endpoint).set_project(appwrite_project_id).set_key(appwrite_api_key)
+        self.client = get_appwrite_client()
         self.storage = Storage(self.client)
+        self.session = get_http_session()
+
+    @property
+    def async_http(self):
+        # Per event loop, so resolved on use rather than in __init__
+        return get_async_http_client()
+
+    def public_url(self, file_id):
+        return f"{appwrite_endpoint}/storage/buckets/{appwrite_bucket_id}/files/{file_id}/view?project={appwrite_project_id}"
 
     def upload_file(self, file_path, remote_filename=None):
         input_file = InputFile.from_path(file_path)  # ✅ fix
@@ -22,37 +93,97 @@ class FileTranslator:
             file_id='unique()',
             file=input_file
         )
-        file_id = result["$id"]
-        public_url = f"{appwrite_endpoint}/storage/buckets/{appwrite_bucket_id}/files/{file_id}/view?project={appwrite_project_id}"
-        return public_url
-
-    def pdf_to_images_and_store(self, pdf_public_url):
-        response = requests.get(pdf_public_url)
-        if response.headers.get("Content-Type") != "application/pdf":
-            raise ValueError("Invalid content type, expected PDF.")
+        return self.public_url(result["$id"])
 
-        pdf_bytes = response.content
-        images = convert_from_bytes(pdf_bytes, dpi=300)
-
-        pdf_name = os.path.splitext(os.path.basename(urlparse(pdf_public_url).path))[0]
-        public_image_urls = []
+    def _upload_headers(self):
+        return {"X-Appwrite-Project": appwrite_project_id, "X-Appwrite-Key": appwrite_api_key}
 
-        for i, image in enumerate(images):
-            filename = f"{pdf_name}_page_{i+1}.jpg"
+    async def aupload_bytes(self, data, filename):
+        with time_stage("upload"):
+            if len(data) >= APPWRITE_SINGLE_UPLOAD_LIMIT:
+                # Chunked uploads stay on the SDK, off the event loop
+                return await asyncio.to_thread(self._upload_bytes, data, filename)
 
-            buffer = BytesIO()
-            image.save(buffer, format="JPEG")
-            buffer.seek(0)
+            response = await self.async_http.post(
+                f"{appwrite_endpoint}/storage/buckets/{appwrite_bucket_id}/files",
+                headers=self._upload_headers(),
+                data={"fileId": "unique()"},
+                files={"file": (filename, data)},
+            )
+            if response.is_error:
+                raise AppwriteException(response.text, response.status_code, None, response.text)
+            return self.public_url(response.json()["$id"])
 
-            input_file = InputFile.from_bytes(buffer.read(), filename=filename)
+    def _upload_bytes(self, data, filename):
+        if len(data) >= APPWRITE_SINGLE_UPLOAD_LIMIT:
+            input_file = InputFile.from_bytes(data, filename=filename)
             result = self.storage.create_file(
                 bucket_id=appwrite_bucket_id,
                 file_id='unique()',
                 file=input_file
             )
-            file_id = result["$id"]
-            public_url = f"{appwrite_endpoint}/storage/buckets/{appwrite_bucket_id}/files/{file_id}/view?project={appwrite_project_id}"
-            public_image_urls.append(public_url)
+            return self.public_url(result["$id"])
+
+        # Same request the SDK sends, but over the pooled keep-alive session
+        response = self.session.post(
+            f"{appwrite_endpoint}/storage/buckets/{appwrite_bucket_id}/files",
+            headers=self._upload_headers(),
+            data={"fileId": "unique()"},
+            files={"file": (filename, data)},
+            timeout=(http_connect_timeout, appwrite_http_timeout),
+        )
+        if not response.ok:
+            raise AppwriteException(response.text, response.status_code, None, response.text)
+        return self.public_url(response.json()["$id"])
+
+    def iter_pdf_pages(self, pdf_path, dpi=None, batch_size=None, skip_pages=()):
+        # skip_pages are left unrendered (e.g. pages already done before a resume)
+        dpi = dpi or pdf_render_dpi
+        batch_size = max(1, batch_size or pdf_render_batch_size)
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+
+        # Render batch_size pages at a time into a temp dir so at most one batch is ever
+        # held by this generator, instead of decoding the whole document up front.
+        for first_page, last_page in page_batches(page_count, batch_size, skip_pages):
+            with tempfile.TemporaryDirectory() as output_folder:
+                with time_stage("rasterize"):
+                    images = convert_from_path(
+                        pdf_path,
+                        dpi=dpi,
+                        first_page=first_page,
+                        last_page=last_page,
+                        output_folder=output_folder,
+                    )
+                page_number = first_page
+                while images:
+                    image = images.pop(0)
+                    yield page_number, page_count, image
+                    image.close()
+                    page_number += 1
+
+    async def adownload_pdf(self, pdf_public_url, file):
+        with time_stage("download"):
+            async with self.async_http.stream("GET", pdf_public_url) as response:
+                check_pdf_response(response.status_code, response.headers)
+                writer = PDFWriter(file)
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    writer.write(chunk)
+                writer.finish()
+
+    @asynccontextmanager
+    async def adownloaded_pdf(self, pdf_public_url):
+        # Streams the PDF to a temp file and yields its path; the file is removed on exit
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Closed before poppler reopens it by name, which Windows requires
+            pdf_path = os.path.join(tmp_dir, "document.pdf")
+            with open(pdf_path, "w+b") as pdf_file:
+                await self.adownload_pdf(pdf_public_url, pdf_file)
+            yield pdf_path
+
+    def iter_page_jpegs(self, pdf_public_url, pdf_path, skip_pages=()):
+        pdf_name = os.path.splitext(os.path.basename(urlparse(pdf_public_url).path))[0]
 
-        print(public_image_urls)
-        return public_image_urls
\ No newline at end of file
+        for page_number, page_count, image in self.iter_pdf_pages(pdf_path, skip_pages=skip_pages):
+            with time_stage("jpeg_encode"):
+                data = encode_page(image)
+            yield page_number, page_count, f"{pdf_name}_page_{page_number}.jpg", data
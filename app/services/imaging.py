@@ -0,0 +1,81 @@
+import math
+from io import BytesIO
+from PIL import Image, ImageOps
+from config.config import (
+    page_grayscale, page_crop_margins, page_max_long_side, page_max_short_side,
+    page_jpeg_quality, page_jpeg_min_quality, page_jpeg_max_bytes,
+)
+
+# Pixels darker than this count as ink when looking for the page's content box; faint
+# ruling and paper texture are lighter and don't stop the crop
+INK_THRESHOLD = 175
+MARGIN_PADDING = 0.02
+
+
+def crop_margins(image: Image.Image):
+    gray = image if image.mode == "L" else image.convert("L")
+    content_box = gray.point(lambda p: 255 if p < INK_THRESHOLD else 0).getbbox()
+    if content_box is None:
+        return image
+    pad_x, pad_y = int(image.width * MARGIN_PADDING), int(image.height * MARGIN_PADDING)
+    left, top, right, bottom = content_box
+    return image.crop((max(0, left - pad_x), max(0, top - pad_y), min(image.width, right + pad_x), min(image.height, bottom + pad_y)))
+
+
+def fit_to_model(image: Image.Image, max_long_side: int, max_short_side: int):
+    # Azure's high-detail vision mode scales images to fit 2048x2048 and then to a shortest
+    # side of 768px, so any pixels beyond that are paid for in upload and tokens but unseen
+    scale = min(1.0, max_long_side / max(image.size), max_short_side / min(image.size))
+    if scale >= 1.0:
+        return image
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+def preprocess_page(image: Image.Image, grayscale: bool = None, crop: bool = None,
+                    max_long_side: int = None, max_short_side: int = None):
+    grayscale = page_grayscale if grayscale is None else grayscale
+    crop = page_crop_margins if crop is None else crop
+    if grayscale:
+        image = ImageOps.grayscale(image)
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if crop:
+        image = crop_margins(image)
+    return fit_to_model(image, max_long_side or page_max_long_side, max_short_side or page_max_short_side)
+
+
+def encode_jpeg(image: Image.Image, max_bytes: int = None, quality: int = None, min_quality: int = None):
+    # Steps quality down until the page fits max_bytes, then shrinks the image by 30% and
+    # retries; after three shrinks the smallest encoding is returned as is
+    max_bytes = page_jpeg_max_bytes if max_bytes is None else max_bytes
+    quality = quality or page_jpeg_quality
+    min_quality = min(quality, min_quality or page_jpeg_min_quality)
+    data = b""
+    for _ in range(4):
+        q = quality
+        while True:
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=q, optimize=True)
+            data = buffer.getvalue()
+            if not max_bytes or len(data) <= max_bytes or q <= min_quality:
+                break
+            q = max(min_quality, q - 10)
+        if not max_bytes or len(data) <= max_bytes:
+            break
+        image = image.resize((max(1, int(image.width * 0.7)), max(1, int(image.height * 0.7))), Image.LANCZOS)
+    return data
+
+
+def encode_page(image: Image.Image, **options):
+    # options: grayscale, crop, max_long_side, max_short_side (see preprocess_page)
+    return encode_jpeg(preprocess_page(image, **options))
+
+
+def vision_tokens(width: int, height: int):
+    # Azure high-detail image cost: fit in 2048x2048, shortest side to 768, 170 tokens per
+    # 512px tile plus 85 base tokens
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
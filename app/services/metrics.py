@@ -0,0 +1,148 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+# Minimal in-process metrics rendered in the Prometheus text format. Values are per
+# worker process; scrape each worker (or run a single worker) to aggregate.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        series = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}"
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = Histogram(
+    "pipeline_stage_seconds", "Time spent in each session-creation stage.", ["stage"],
+)
+model_call_seconds = Histogram(
+    "model_call_seconds", "Latency of Azure OpenAI completion calls.", ["call", "model"],
+)
+model_call_errors = Counter(
+    "model_call_errors_total", "Azure OpenAI completion calls that raised.", ["call", "model"],
+)
+model_call_retries = Counter(
+    "model_call_retries_total", "Azure OpenAI calls retried after a throttling or transient error.", ["call", "model"],
+)
+scheduler_wait_seconds = Histogram(
+    "model_scheduler_wait_seconds", "Time calls waited for deployment quota before being sent.", ["priority"],
+)
+completion_cache_lookups = Counter(
+    "completion_cache_lookups_total", "OCR and transform cache lookups by the tier that answered, or miss.", ["kind", "result"],
+)
+answer_cache_lookups = Counter(
+    "answer_cache_lookups_total", "Chat answer cache lookups by result; follow_ups are turns not cached.", ["result"],
+)
+model_tokens = Counter(
+    "model_tokens_total", "Tokens reported in completion usage.", ["call", "model", "type"],
+)
+
+
+def time_stage(stage: str):
+    return stage_seconds.time(stage=stage)
+
+
+def record_usage(call: str, model: str, response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    model_tokens.inc(usage.prompt_tokens or 0, call=call, model=model, type="prompt")
+    # Embedding usage has no completion tokens
+    model_tokens.inc(getattr(usage, "completion_tokens", 0) or 0, call=call, model=model, type="completion")
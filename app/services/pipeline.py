@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config.config import ocr_max_workers, upload_max_workers
+from services.chatbot import PageOCRError
+from services.clients import aclose_async_clients, run_blocking
+from services.metrics import time_stage
+from services.retrieval import build_index
+
+logger = logging.getLogger(__name__)
+
+
+def page_is_complete(page):
+    return bool(page.get("image_url")) and page.get("ocr_text") is not None
+
+
+async def _reuse(value):
+    return value
+
+
+async def arender_upload_and_ocr(pdf_public_url, file_translator, bot, max_workers: int = None, on_progress=None,
+                                 done_pages=None, on_page=None):
+    # done_pages maps page numbers to results of an earlier attempt ({"image_url",
+    # "image_hash", "ocr_text"}): complete pages are not rendered again, and a page that
+    # renders to the same bytes only redoes its missing half. on_page(page_number, result)
+    # checkpoints each page as soon as its OCR and upload have finished.
+    done_pages = done_pages or {}
+    ocr_workers = max(1, max_workers or ocr_max_workers)
+    upload_workers = max(1, upload_max_workers)
+    ocr_slots = asyncio.Semaphore(ocr_workers)
+    upload_slots = asyncio.Semaphore(upload_workers)
+    # The renderer stays at most this many pages ahead of OCR and upload, so rendered
+    # pages never pile up in memory faster than they are processed.
+    backlog = asyncio.Semaphore(2 * max(ocr_workers, upload_workers))
+    # Checkpoints and progress updates are DB writes made from worker threads; one writer at a
+    # time keeps concurrent pages from contending for the same rows (or SQLite's write lock)
+    db_writer = asyncio.Lock()
+    completed = 0
+
+    async def write(callback, *args):
+        async with db_writer:
+            await run_blocking(callback, *args)
+
+    async def ocr(data):
+        async with ocr_slots:
+            with time_stage("ocr"):
+                return await bot.aimage_to_text(data)
+
+    async def upload(data, filename):
+        async with upload_slots:
+            return await file_translator.aupload_bytes(data, filename)
+
+    async def process_page(page_number, data, filename):
+        # The rendered JPEG bytes go straight to the vision model; the Appwrite upload
+        # runs alongside it instead of being a prerequisite for OCR.
+        nonlocal completed
+        try:
+            image_hash = hashlib.sha256(data).hexdigest()
+            previous = done_pages.get(page_number, {})
+            if previous.get("image_hash") != image_hash:
+                previous = {}
+            ocr_result, upload_result = await asyncio.gather(
+                _reuse(previous["ocr_text"]) if previous.get("ocr_text") is not None else ocr(data),
+                _reuse(previous["image_url"]) if previous.get("image_url") else upload(data, filename),
+                return_exceptions=True,
+            )
+            errors = []
+            if isinstance(ocr_result, Exception):
+                errors.append(f"ocr: {ocr_result}")
+                ocr_result = None
+            if isinstance(upload_result, Exception):
+                errors.append(f"upload: {upload_result}")
+                upload_result = None
+            result = {"image_url": upload_result, "image_hash": image_hash, "ocr_text": ocr_result, "error": "; ".join(errors) or None}
+            if on_page:
+                try:
+                    await write(on_page, page_number, result)
+                except Exception as e:
+                    # A lost checkpoint fails this page, so a rerun redoes it, instead of
+                    # aborting the pages still in flight
+                    logger.exception("Checkpoint of page %s failed", page_number)
+                    errors.append(f"checkpoint: {e}")
+                    result = {**result, "error": "; ".join(errors)}
+            return page_number, result
+        finally:
+            completed += 1
+            backlog.release()
+
+    skipped = {number: page for number, page in done_pages.items() if page_is_complete(page)}
+    tasks, page_count = [], len(skipped)
+    # The PDF is streamed to disk and poppler rasterizes it from there; the file is only
+    # needed until the last page has been rendered
+    async with file_translator.adownloaded_pdf(pdf_public_url) as pdf_path:
+        pages = file_translator.iter_page_jpegs(pdf_public_url, pdf_path, skip_pages=set(skipped))
+        while True:
+            await backlog.acquire()
+            # Rasterizing and JPEG encoding are CPU-bound and stay off the event loop
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                backlog.release()
+                break
+            page_number, page_count, filename, data = page
+            tasks.append(asyncio.create_task(process_page(page_number, data, filename)))
+            if on_progress:
+                await write(on_progress, len(skipped) + completed, page_count)
+
+    results = {**skipped, **dict(await asyncio.gather(*tasks))}
+    public_image_urls, ocr_texts, failures = [], [], {}
+    for page_number in sorted(results):
+        result = results[page_number]
+        if result.get("error"):
+            failures[page_number] = result["error"]
+        if result.get("image_url"):
+            public_image_urls.append(result["image_url"])
+        if result.get("ocr_text") is not None:
+            ocr_texts.append(result["ocr_text"])
+
+    if on_progress:
+        await write(on_progress, page_count, page_count)
+    if failures:
+        raise PageOCRError(failures)
+    return public_image_urls, ocr_texts
+
+
+def render_upload_and_ocr(pdf_public_url, file_translator, bot, max_workers: int = None, on_progress=None,
+                          done_pages=None, on_page=None):
+    # Sync entry point for job threads: runs the async page stage on a private loop and
+    # closes that loop's HTTP clients afterwards.
+    async def run():
+        try:
+            return await arender_upload_and_ocr(pdf_public_url, file_translator, bot, max_workers, on_progress, done_pages, on_page)
+        finally:
+            await aclose_async_clients()
+    return asyncio.run(run())
+
+
+def _timed(stage, fn, *args):
+    with time_stage(stage):
+        return fn(*args)
+
+
+def run_post_ocr_stage(bot, ocr_texts, specifications=None):
+    # Transform, naming/keywords and indexing only depend on the OCR text, so they run
+    # side by side. Returns (finalized_text, session_name, session_keywords, document_index).
+    ocr_text = "\n".join(ocr_texts)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        transform = executor.submit(_timed, "transform", bot.transform_document, ocr_texts, specifications) if specifications else None
+        description = executor.submit(_timed, "describe", bot.describe_document, ocr_text) if ocr_texts else None
+        index = executor.submit(_timed, "index", build_index, ocr_text)
+
+        finalized_text = transform.result() if transform else None
+        session_name, session_keywords = description.result() if description else (bot.create_session_name(""), None)
+        return finalized_text, session_name, session_keywords, index.result()
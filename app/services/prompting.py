@@ -0,0 +1,95 @@
+import math
+from config.config import chat_prompt_token_budget, chat_history_token_budget
+
+# Fixed instructions arag_chatbot wraps around the context, plus per-message framing
+PROMPT_OVERHEAD_TOKENS = 120
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # tiktoken is optional; without it (or its BPE files) we fall back to an estimate
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def format_turn(turn):
+    return f"User: {turn['user_query']}\nAssistant: {turn['response'] or ''}"
+
+
+def split_history(turns, budget_tokens):
+    # turns are oldest first; keeps the newest turns that fit and returns (kept, dropped)
+    kept, used = [], 0
+    for position in range(len(turns) - 1, -1, -1):
+        cost = count_tokens(format_turn(turns[position]))
+        if used + cost > budget_tokens:
+            return turns[position + 1:], turns[:position + 1]
+        kept.append(turns[position])
+        used += cost
+    return turns, []
+
+
+def format_history(summary, turns):
+    sections = []
+    if summary:
+        sections.append(f"Summary of the earlier conversation:\n{summary}")
+    if turns:
+        sections.append("Most recent turns:\n" + "\n\n".join(format_turn(turn) for turn in turns))
+    return "\n\n".join(sections) or "None"
+
+
+def fit_chunks(ranked_chunks, budget_tokens):
+    # ranked_chunks are (position, chunk) pairs, best first; the best ones that fit are
+    # returned joined in document order
+    selected, used = [], 0
+    separator_cost = count_tokens(CHUNK_SEPARATOR)
+    for position, chunk in ranked_chunks:
+        cost = count_tokens(chunk) + separator_cost
+        if used + cost > budget_tokens:
+            continue
+        selected.append((position, chunk))
+        used += cost
+    return CHUNK_SEPARATOR.join(chunk for _, chunk in sorted(selected))
+
+
+def document_budget(user_query, history_text, total_budget=None):
+    total_budget = total_budget or chat_prompt_token_budget
+    return max(0, total_budget - PROMPT_OVERHEAD_TOKENS - count_tokens(user_query) - count_tokens(history_text))
+
+
+def history_budget():
+    return min(chat_history_token_budget, chat_prompt_token_budget // 2)
+
+
+def split_pages(pages, budget_tokens):
+    # Groups consecutive pages into chunks of at most budget_tokens; a page larger than
+    # the budget becomes a chunk of its own
+    chunks, current, used = [], [], 0
+    for page in pages:
+        cost = count_tokens(page)
+        if current and used + cost > budget_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(page)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
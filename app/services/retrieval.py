@@ -0,0 +1,138 @@
+import re
+import time
+import zlib
+import numpy as np
+from services.clients import get_azure_openai_client
+from services.metrics import model_call_errors, model_call_seconds, record_usage
+from services.scheduler import estimate_embedding_tokens, run_with_quota
+from config.config import azure_embedding_deployment_name, retrieval_embedder, retrieval_top_k, retrieval_chunk_words, retrieval_chunk_overlap
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    # Offline bag-of-words embedder (signed feature hashing of unigrams and bigrams).
+    # Needs no network access, so retrieval works in tests and local development.
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def embed(self, texts, call: str = "embed"):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vectors
+
+
+class AzureEmbedder:
+    def __init__(self, client=None, deployment: str = None, batch_size: int = 64):
+        self.client = client or get_azure_openai_client()
+        self.deployment = deployment or azure_embedding_deployment_name
+        self.batch_size = batch_size
+        self.name = f"azure:{self.deployment}"
+
+    def _create(self, call: str, batch):
+        # Recorded like completions in AzureChatbot._create
+        started = time.perf_counter()
+        try:
+            response = self.client.embeddings.create(model=self.deployment, input=batch)
+        except Exception:
+            model_call_errors.inc(call=call, model=self.deployment)
+            raise
+        finally:
+            model_call_seconds.observe(time.perf_counter() - started, call=call, model=self.deployment)
+        record_usage(call, self.deployment, response)
+        return response
+
+    def embed(self, texts, call: str = "embed"):
+        # call is "embed_query" for a chat question, which is admitted as interactive
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = run_with_quota(self.deployment, call, estimate_embedding_tokens(batch), lambda: self._create(call, batch))
+            vectors.extend(item.embedding for item in response.data)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def get_embedder(name: str = None):
+    name = name or retrieval_embedder
+    if name == "azure":
+        return AzureEmbedder()
+    if name == "local":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown retrieval embedder '{name}'.")
+
+
+def chunk_text(text: str, max_words: int = None, overlap: int = None):
+    max_words = max_words or retrieval_chunk_words
+    overlap = min(overlap if overlap is not None else retrieval_chunk_overlap, max_words - 1)
+    chunks, current = [], []
+
+    # Paragraphs are packed into chunks whole; only paragraphs longer than a chunk are split
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+        while len(current) + len(words) > max_words:
+            take = max_words - len(current)
+            chunks.append(" ".join(current + words[:take]))
+            current = (current + words[:take])[-overlap:] if overlap else []
+            words = words[take:]
+        current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def build_index(text: str, embedder=None):
+    embedder = embedder or get_embedder()
+    chunks = chunk_text(text)
+    vectors = _normalize(embedder.embed(chunks)) if chunks else np.zeros((0, 0), dtype=np.float32)
+    return {
+        "embedder": embedder.name,
+        "dim": int(vectors.shape[1]) if chunks else 0,
+        "chunks": chunks,
+        "vectors": np.round(vectors, 5).tolist(),
+    }
+
+
+def is_current_index(index, embedder=None):
+    embedder = embedder or get_embedder()
+    return isinstance(index, dict) and index.get("embedder") == embedder.name and "chunks" in index
+
+
+def rank_chunks(index, query: str, k: int = None, embedder=None):
+    # Returns (position, chunk) pairs, best match first
+    embedder = embedder or get_embedder()
+    chunks = index.get("chunks") or []
+    if not chunks:
+        return []
+
+    k = min(k or retrieval_top_k, len(chunks))
+    matrix = np.asarray(index["vectors"], dtype=np.float32)
+    query_vector = _normalize(embedder.embed([query], call="embed_query"))[0]
+    scores = matrix @ query_vector
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [(int(i), chunks[i]) for i in top]
+
+
+def retrieve(index, query: str, k: int = None, embedder=None):
+    ranked = rank_chunks(index, query, k=k, embedder=embedder)
+    # Hand the model the selected chunks in document order rather than score order
+    return [chunk for _, chunk in sorted(ranked)]
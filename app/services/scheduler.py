@@ -0,0 +1,262 @@
+import asyncio
+import base64
+import math
+import random
+import time
+from io import BytesIO
+from threading import Lock
+from django.db import transaction
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from PIL import Image
+from config.config import (
+    azure_tpm_limit, azure_rpm_limit, azure_rate_limit_backend, azure_rate_limit_burst_seconds,
+    azure_rate_limit_interactive_reserve, azure_retry_base_delay, azure_retry_max_delay, azure_max_retries,
+)
+from services.clients import run_blocking
+from services.imaging import vision_tokens
+from services.metrics import model_call_retries, scheduler_wait_seconds
+
+# Admits Azure OpenAI calls against the deployment's tokens-per-minute and requests-per-
+# minute quota. Each deployment has a token bucket holding burst_seconds worth of quota;
+# calls are charged their estimated tokens up front, the way Azure counts them. Bulk calls
+# (OCR, transforms) leave a reserve in the bucket that only interactive calls (chat) may
+# spend, so chat keeps getting through while a large notebook is being processed.
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+INTERACTIVE_CALLS = {"chat", "chat_stream", "summarize", "embed_query"}
+
+# Errors worth retrying: 429s, timeouts/connection failures (APITimeoutError is an
+# APIConnectionError) and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+DEFAULT_COMPLETION_TOKENS = 1024
+MAX_IMAGE_TOKENS = vision_tokens(768, 2048)
+MAX_POLL_SECONDS = 5.0
+# Enough base64 for the header of the JPEGs encode_page produces, which is all PIL
+# needs for the page size
+IMAGE_HEADER_CHARS = 4096
+
+
+def call_priority(call: str):
+    return INTERACTIVE if call in INTERACTIVE_CALLS else BULK
+
+
+def _image_size(data: str):
+    # Decodes only the start of the image when the size is found there
+    for chars in (IMAGE_HEADER_CHARS, len(data)):
+        try:
+            with Image.open(BytesIO(base64.b64decode(data[:chars]))) as image:
+                return image.size
+        except Exception:
+            continue
+    return None
+
+
+def _image_tokens(url: str):
+    size = _image_size(url.split(",", 1)[1]) if url.startswith("data:") else None
+    return vision_tokens(*size) if size else MAX_IMAGE_TOKENS
+
+
+def estimate_tokens(request: dict):
+    # Azure's quota is charged on an estimate of the prompt (roughly characters / 4) plus
+    # max_tokens, so that is what the bucket charges too. Callers estimate once per request
+    # and charge the same amount on every attempt.
+    tokens = 0
+    for message in request.get("messages", []):
+        content = message.get("content") or ""
+        for part in [content] if isinstance(content, str) else content:
+            if isinstance(part, str):
+                tokens += math.ceil(len(part) / 4)
+            elif part.get("type") == "text":
+                tokens += math.ceil(len(part["text"]) / 4)
+            elif part.get("type") == "image_url":
+                tokens += _image_tokens(part["image_url"]["url"])
+        tokens += 4
+    return tokens + (request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def estimate_embedding_tokens(texts):
+    return sum(math.ceil(len(text) / 4) for text in texts)
+
+
+def _limits():
+    # (field, refill per second, capacity) for each configured quota
+    for field, per_minute in (("tokens", azure_tpm_limit), ("requests", azure_rpm_limit)):
+        if per_minute:
+            rate = per_minute / 60
+            yield field, rate, rate * azure_rate_limit_burst_seconds
+
+
+def _new_state():
+    return {"tokens": None, "requests": None, "updated_at": None}
+
+
+def _refill(state, now):
+    elapsed = max(0.0, now - state["updated_at"]) if state["updated_at"] is not None else 0.0
+    for field, rate, capacity in _limits():
+        level = state[field]
+        state[field] = capacity if level is None else min(capacity, level + elapsed * rate)
+    state["updated_at"] = now
+
+
+def _take(state, tokens: int, priority: str, now: float):
+    # Charges the call and returns 0 if it fits, else the seconds until it would. A call
+    # larger than the bucket is admitted once the bucket is full and leaves it in debt.
+    _refill(state, now)
+    costs = {"tokens": tokens, "requests": 1}
+    wait = 0.0
+    for field, rate, capacity in _limits():
+        floor = capacity * azure_rate_limit_interactive_reserve if priority == BULK else 0.0
+        needed = min(costs[field], capacity - floor)
+        if state[field] - floor < needed:
+            wait = max(wait, (floor + needed - state[field]) / rate)
+    if wait:
+        return wait
+    for field, _, _ in _limits():
+        state[field] -= costs[field]
+    return 0.0
+
+
+def _penalize(state, seconds: float, now: float):
+    # After a 429 the bucket is drained so that every worker holds off for Retry-After
+    _refill(state, now)
+    for field, rate, _ in _limits():
+        state[field] = min(state[field], -rate * seconds)
+
+
+class QuotaScheduler:
+    def __init__(self, backend: str = None):
+        self.backend = backend or azure_rate_limit_backend
+        self._states = {}
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.backend != "off" and bool(azure_tpm_limit or azure_rpm_limit)
+
+    def _local_update(self, name, update, *args):
+        with self._lock:
+            state = self._states.setdefault(name, _new_state())
+            return update(state, *args, time.time())
+
+    def _db_update(self, name, update, *args):
+        from user.models import RateLimitBucket
+
+        with transaction.atomic():
+            bucket, _ = RateLimitBucket.objects.select_for_update().get_or_create(name=name)
+            # A fresh row (updated_at 0) starts with full buckets
+            state = {"tokens": bucket.tokens, "requests": bucket.requests, "updated_at": bucket.updated_at}
+            if not bucket.updated_at:
+                state = _new_state()
+            result = update(state, *args, time.time())
+            bucket.tokens = state["tokens"] or 0
+            bucket.requests = state["requests"] or 0
+            bucket.updated_at = state["updated_at"]
+            bucket.save()
+            return result
+
+    def _update(self, name, update, *args):
+        if self.backend == "db":
+            return self._db_update(name, update, *args)
+        return self._local_update(name, update, *args)
+
+    def _next_wait(self, name, tokens, priority):
+        wait = self._update(name, _take, tokens, priority)
+        # Jitter keeps waiting workers from all polling the shared bucket at once
+        return min(wait, MAX_POLL_SECONDS) * random.uniform(1.0, 1.2) if wait else 0.0
+
+    def acquire(self, name: str, tokens: int, priority: str = BULK):
+        # Blocks until the call fits the quota; returns the seconds waited
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while wait := self._next_wait(name, tokens, priority):
+            time.sleep(wait)
+            waited += wait
+        scheduler_wait_seconds.observe(waited, priority=priority)
+        return waited
+
+    async def aacquire(self, name: str, tokens: int, priority: str = BULK):
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while True:
+            if self.backend == "db":
+                wait = await run_blocking(self._next_wait, name, tokens, priority)
+            else:
+                wait = self._next_wait(name, tokens, priority)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        scheduler_wait_seconds.observe(waited, priority=priority)
+        return waited
+
+    def penalize(self, name: str, seconds: float):
+        if self.enabled:
+            self._update(name, _penalize, seconds)
+
+    async def apenalize(self, name: str, seconds: float):
+        if self.enabled and self.backend == "db":
+            await run_blocking(self.penalize, name, seconds)
+        else:
+            self.penalize(name, seconds)
+
+
+def retry_after(error):
+    # Azure sends retry-after-ms and/or retry-after (seconds) on 429s
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def retry_delay(error, attempt: int):
+    # Honors Retry-After when given, otherwise exponential backoff with full jitter
+    delay = retry_after(error)
+    if delay is not None:
+        return delay + random.uniform(0, azure_retry_base_delay)
+    return random.uniform(0, min(azure_retry_max_delay, azure_retry_base_delay * 2 ** attempt))
+
+
+scheduler = QuotaScheduler()
+
+
+def run_with_quota(name: str, call: str, tokens: int, create):
+    # Waits for deployment quota, then retries throttled and transient failures of create()
+    priority = call_priority(call)
+    for attempt in range(azure_max_retries + 1):
+        scheduler.acquire(name, tokens, priority)
+        try:
+            return create()
+        except RETRYABLE_ERRORS as e:
+            if attempt == azure_max_retries:
+                raise
+            delay = retry_delay(e, attempt)
+            if isinstance(e, RateLimitError):
+                scheduler.penalize(name, delay)
+            model_call_retries.inc(call=call, model=name)
+            time.sleep(delay)
+
+
+async def arun_with_quota(name: str, call: str, tokens: int, create):
+    priority = call_priority(call)
+    for attempt in range(azure_max_retries + 1):
+        await scheduler.aacquire(name, tokens, priority)
+        try:
+            return await create()
+        except RETRYABLE_ERRORS as e:
+            if attempt == azure_max_retries:
+                raise
+            delay = retry_delay(e, attempt)
+            if isinstance(e, RateLimitError):
+                await scheduler.apenalize(name, delay)
+            model_call_retries.inc(call=call, model=name)
+            await asyncio.sleep(delay)
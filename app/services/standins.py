@@ -0,0 +1,311 @@
+import asyncio
+import json
+import random
+import re
+import shutil
+import time
+from contextlib import asynccontextmanager
+from io import BytesIO
+from types import SimpleNamespace
+from uuid import uuid4
+from PIL import Image, ImageDraw, ImageFont
+from services.chatbot import AzureChatbot
+from services.filetranslator import FileTranslator
+
+# Offline replacements for Azure OpenAI, Appwrite Storage and the PDF download, used by
+# the benchmark harness. They sit at the network boundary so the real request building,
+# caching and upload code in AzureChatbot/FileTranslator still runs.
+
+WORDS = (
+    "matrix vector eigenvalue integral derivative limit theorem proof lemma function "
+    "series convergence probability variance gradient tensor basis kernel norm field"
+).split()
+
+
+class StandInError(Exception):
+    pass
+
+
+class Latency:
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.mean = mean
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def _delay(self):
+        return self.mean + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.mean
+
+    def _maybe_fail(self, what):
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise StandInError(f"injected {what} failure")
+
+    def wait(self, what: str):
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+        self._maybe_fail(what)
+
+    async def await_(self, what: str):
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._maybe_fail(what)
+
+
+def filler_text(words: int, seed: int = 0):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _completion(content, usage_tokens):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=_usage(usage_tokens, content),
+    )
+
+
+def _usage(prompt_tokens, content):
+    completion_tokens = len(content.split())
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+
+def _stream(content, delay, usage=None):
+    for word in content.split(" "):
+        if delay:
+            time.sleep(delay)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+    if usage:
+        # With stream_options include_usage, a final chunk without choices carries the usage
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _Stream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        self.chunks.close()
+
+
+class _AsyncStream:
+    def __init__(self, text, delay, usage=None):
+        self.words = text.split(" ")
+        self.delay = delay
+        self.usage = usage
+
+    async def __aiter__(self):
+        for word in self.words:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+        if self.usage:
+            yield SimpleNamespace(choices=[], usage=self.usage)
+
+    async def close(self):
+        pass
+
+
+class StandInCompletions:
+    def __init__(self, latency: Latency, ocr_latency: Latency = None, ocr_words: int = 250, answer_words: int = 120):
+        self.latency = latency
+        self.ocr_latency = ocr_latency or latency
+        self.ocr_words = ocr_words
+        self.answer_words = answer_words
+
+    def _respond(self, messages, response_format):
+        # Returns (latency, failure label, text, prompt tokens)
+        content = messages[-1]["content"]
+        prompt_tokens = sum(len(str(message["content"])) for message in messages) // 4
+        if isinstance(content, list):
+            # Vision request: one OCR'd page
+            return self.ocr_latency, "ocr", filler_text(self.ocr_words, seed=prompt_tokens), prompt_tokens
+        if response_format and response_format.get("type") == "json_object":
+            text = json.dumps({"session_name": filler_text(5, seed=prompt_tokens), "keywords": filler_text(6, seed=prompt_tokens + 1).split()})
+        else:
+            text = filler_text(self.answer_words, seed=prompt_tokens)
+        return self.latency, "completion", text, prompt_tokens
+
+    def create(self, messages, stream=False, response_format=None, stream_options=None, **kwargs):
+        latency, what, text, prompt_tokens = self._respond(messages, response_format)
+        latency.wait(what)
+        if stream:
+            usage = _usage(prompt_tokens, text) if (stream_options or {}).get("include_usage") else None
+            return _Stream(_stream(text, self.latency.mean / max(1, self.answer_words), usage))
+        return _completion(text, prompt_tokens)
+
+
+class StandInAsyncCompletions(StandInCompletions):
+    async def create(self, messages, stream=False, response_format=None, stream_options=None, **kwargs):
+        latency, what, text, prompt_tokens = self._respond(messages, response_format)
+        await latency.await_(what)
+        if stream:
+            usage = _usage(prompt_tokens, text) if (stream_options or {}).get("include_usage") else None
+            return _AsyncStream(text, self.latency.mean / max(1, self.answer_words), usage)
+        return _completion(text, prompt_tokens)
+
+
+class StandInChatbot(AzureChatbot):
+    completions = async_completions = None  # set by configure_standins
+
+    def __init__(self):
+        self.endpoint = self.subscription_key = self.api_version = ""
+        self.model = "stand-in"
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+
+    @property
+    def async_client(self):
+        return SimpleNamespace(chat=SimpleNamespace(completions=self.async_completions))
+
+
+class StandInStorage:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def create_file(self, bucket_id, file_id, file, permissions=None, on_progress=None):
+        self.latency.wait("upload")
+        return {"$id": uuid4().hex}
+
+
+class _Response:
+    # Quacks like both requests.Response (ok) and httpx.Response (is_error)
+    def __init__(self, status_code=200, content=b"", headers=None, payload=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.is_error = not self.ok
+        self.content = content
+        self.headers = headers or {}
+        self.text = json.dumps(payload) if payload is not None else ""
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    async def aiter_bytes(self, chunk_size=None):
+        for chunk in self.iter_content(chunk_size or len(self.content) or 1):
+            yield chunk
+
+
+class StandInHTTPSession:
+    def __init__(self, upload_latency: Latency, download_latency: Latency, pdf_source):
+        self.upload_latency = upload_latency
+        self.download_latency = download_latency
+        self.pdf_source = pdf_source
+
+    def post(self, url, headers=None, data=None, files=None, timeout=None):
+        try:
+            self.upload_latency.wait("upload")
+        except StandInError as e:
+            return _Response(503, payload={"message": str(e)})
+        return _Response(201, payload={"$id": uuid4().hex})
+
+
+class StandInAsyncHTTPClient(StandInHTTPSession):
+    async def post(self, url, headers=None, data=None, files=None, timeout=None):
+        try:
+            await self.upload_latency.await_("upload")
+        except StandInError as e:
+            return _Response(503, payload={"message": str(e)})
+        return _Response(201, payload={"$id": uuid4().hex})
+
+    @asynccontextmanager
+    async def stream(self, method, url, timeout=None, **kwargs):
+        await self.download_latency.await_("download")
+        yield _Response(200, content=self.pdf_source(url), headers={"Content-Type": "application/pdf"})
+
+
+def make_page_image(width: int = 1240, height: int = 1754, seed: int = 0):
+    # A photographed notebook page: tinted, slightly noisy paper with ruled lines and ink
+    # inside the margins, so size reductions measured on it carry over to real uploads
+    rng = random.Random(seed)
+    paper = Image.merge("RGB", [
+        Image.effect_noise((width, height), 6).point(lambda p, base=base: min(255, base + (p - 128) // 4))
+        for base in (246, 242, 230)
+    ])
+    draw = ImageDraw.Draw(paper)
+    line_gap = max(12, height // 32)
+    font = ImageFont.load_default(size=int(line_gap * 0.6))
+    left, right = width // 8, width - width // 16
+    for y in range(height // 8, height - height // 12, line_gap):
+        draw.line([(0, y), (width, y)], fill=(170, 190, 215), width=max(1, height // 1000))
+        if rng.random() < 0.8:
+            text = filler_text(rng.randint(3, 6), seed=rng.randint(0, 1 << 30))
+            draw.text((left + rng.randint(0, width // 20), y - int(line_gap * 0.75)), text, fill=(25, 35, 90), font=font)
+    draw.line([(left - 10, 0), (left - 10, height)], fill=(215, 120, 120), width=max(1, width // 600))
+    return paper.crop((0, 0, min(width, right + width // 16), height))
+
+
+def make_pdf(pages: int, width: int = 1240, height: int = 1754, seed: int = 0):
+    images = [make_page_image(width, height, seed + page) for page in range(pages)]
+    buffer = BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def can_render_pdfs():
+    return shutil.which("pdftoppm") is not None
+
+
+class StandInFileTranslator(FileTranslator):
+    storage_latency = download_latency = None  # set by configure_standins
+    pdfs = {}
+    render_pages = True
+    page_size = (1240, 1754)
+    page_images = {}  # (page_size, page_number) -> synthetic page image
+
+    def __init__(self):
+        self.client = None
+        self.storage = StandInStorage(self.storage_latency)
+        self.session = StandInHTTPSession(self.storage_latency, self.download_latency, self.pdfs.__getitem__)
+
+    @property
+    def async_http(self):
+        return StandInAsyncHTTPClient(self.storage_latency, self.download_latency, self.pdfs.__getitem__)
+
+    def iter_pdf_pages(self, pdf_path, dpi=None, batch_size=None, skip_pages=()):
+        if self.render_pages:
+            yield from super().iter_pdf_pages(pdf_path, dpi, batch_size, skip_pages)
+            return
+        # Without poppler, emit synthetic page images of the configured size instead
+        with open(pdf_path, "rb") as pdf_file:
+            page_count = int(re.search(rb"/Count (\d+)", pdf_file.read()).group(1))
+        for page_number in range(1, page_count + 1):
+            if page_number in skip_pages:
+                continue
+            yield page_number, page_count, self.page_image(page_number)
+
+    @classmethod
+    def page_image(cls, page_number):
+        key = (cls.page_size, page_number)
+        if key not in cls.page_images:
+            cls.page_images[key] = make_page_image(*cls.page_size, seed=page_number)
+        return cls.page_images[key]
+
+    @classmethod
+    def prepare_pages(cls, page_count):
+        # Drawing a synthetic page takes longer than processing it, so benchmarks draw
+        # them before timing starts; iter_pdf_pages then only hands them out
+        for page_number in range(1, page_count + 1):
+            cls.page_image(page_number)
+
+
+def configure_standins(llm_latency: Latency, ocr_latency: Latency, storage_latency: Latency, download_latency: Latency,
+                       ocr_words: int = 250, answer_words: int = 120, render_pages: bool = None):
+    StandInChatbot.completions = StandInCompletions(llm_latency, ocr_latency, ocr_words, answer_words)
+    StandInChatbot.async_completions = StandInAsyncCompletions(llm_latency, ocr_latency, ocr_words, answer_words)
+    StandInFileTranslator.storage_latency = storage_latency
+    StandInFileTranslator.download_latency = download_latency
+    StandInFileTranslator.render_pages = can_render_pdfs() if render_pages is None else render_pages
@@ -1,8 +1,13 @@
 from django.contrib import admin
-from .models import UserProfile, ChatSessions, UserSession
+from .models import UserProfile, ChatSessions, UserSession, SessionJob, CachedCompletion, ChatMessage, Keyword, SessionPage
 
 # Register your models here.
 admin.site.register([UserProfile,
                      ChatSessions,
+                     ChatMessage,
                      UserSession,
+                     SessionJob,
+                     CachedCompletion,
+                     Keyword,
+                     SessionPage,
                      ])
\ No newline at end of file
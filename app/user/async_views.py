@@ -0,0 +1,104 @@
+import asyncio
+import openai
+from asgiref.sync import sync_to_async
+from django.utils.functional import classproperty
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from services.chatbot import AzureChatbot
+from .chat import answer_chat_turn
+from .models import ChatSessions
+from .serializers import ChatSessionsSerializer, ChatTurnSerializer
+
+# DRF's APIView only dispatches to sync handlers. AsyncAPIView keeps DRF's request
+# parsing, authentication, permissions, exception handling and renderers, but awaits
+# async handlers so that under ASGI (app/asgi.py) a request waiting on Azure holds no thread.
+
+
+class UpstreamBadGateway(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "The language model returned an error."
+    default_code = 'upstream_error'
+
+
+class UpstreamUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The language model is unavailable or over capacity; try again shortly."
+    default_code = 'upstream_unavailable'
+
+
+def upstream_exception(exc):
+    # Azure OpenAI failures that survived the scheduler's retries
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return UpstreamUnavailable()
+    return UpstreamBadGateway()
+
+
+class AsyncAPIView(APIView):
+    @classproperty
+    def view_is_async(cls):
+        # Makes View.as_view mark the view as a coroutine function for Django's handlers
+        return True
+
+    def handle_exception(self, exc):
+        if isinstance(exc, openai.APIError):
+            exc = upstream_exception(exc)
+        return super().handle_exception(exc)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication and permission checks may query the DB
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class ChatSessionsView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, session_id):
+        chat_session = await ChatSessions.objects.filter(session_id=session_id, session__user=request.user).afirst()
+        if chat_session is None:
+            return Response({"error": "User session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = await sync_to_async(lambda: ChatSessionsSerializer([chat_session], many=True).data)()
+        return Response(data, status=status.HTTP_200_OK)
+
+    async def put(self, request, session_id):
+        serializer = ChatTurnSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_query, use_cache = serializer.validated_data['user_query'], serializer.validated_data['use_cache']
+
+        try:
+            chat_session = await ChatSessions.objects.select_related('session').aget(session_id=session_id, session__user=request.user)
+        except ChatSessions.DoesNotExist:
+            return Response({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        bot = AzureChatbot()
+        try:
+            response, cached = await answer_chat_turn(chat_session, user_query, bot, use_cache=use_cache)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        await sync_to_async(chat_session.append_message)(user_query, response)
+        data = await sync_to_async(lambda: ChatSessionsSerializer(chat_session).data)()
+        return Response({"chat_session": data, "response": response, "cached": cached}, status=status.HTTP_200_OK)
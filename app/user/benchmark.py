@@ -0,0 +1,245 @@
+import asyncio
+import base64
+import json
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from contextlib import ExitStack
+from unittest import mock
+from PIL import Image
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from services.cache import answer_cache, ocr_cache, transform_cache
+from services.imaging import vision_tokens
+from services.standins import StandInChatbot, StandInFileTranslator, filler_text, make_pdf
+from .jobs import run_job
+from .models import ChatSessions, SessionJob, UserSession
+from .async_views import ChatSessionsView
+from .views import UserSessionView
+
+# Drives UserSessionView and the async ChatSessionsView in-process against the stand-ins
+# in services.standins; see `manage.py benchmark`.
+
+_factory = APIRequestFactory()
+_async_factory = RequestFactory()
+_create_view = UserSessionView.as_view()
+_chat_view = ChatSessionsView.as_view()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the lifetime peak (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class RSSSampler:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def standin_patches(use_cache=False):
+    stack = ExitStack()
+    for target in ("user.pipeline.AzureChatbot", "user.serializers.AzureChatbot", "user.async_views.AzureChatbot", "user.streaming.AzureChatbot"):
+        stack.enter_context(mock.patch(target, StandInChatbot))
+    stack.enter_context(mock.patch("user.pipeline.FileTranslator", StandInFileTranslator))
+    # Jobs run inline in the benchmark thread rather than on the in-process executor
+    stack.enter_context(mock.patch("user.jobs.session_jobs_in_process", False))
+    stack.enter_context(mock.patch("services.retrieval.retrieval_embedder", "local"))
+    stack.enter_context(mock.patch.object(ocr_cache, "enabled", use_cache))
+    stack.enter_context(mock.patch.object(answer_cache, "enabled", use_cache))
+    stack.enter_context(mock.patch.object(transform_cache, "enabled", use_cache))
+    return stack
+
+
+def _summarize(outcomes, errors, elapsed, rss_peak):
+    latencies = [latency for latency, _ in outcomes]
+    requests = len(outcomes)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "peak_rss_mb": round(rss_peak / (1024 * 1024), 1),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def _run(request_fn, requests, concurrency):
+    # Sync requests, `concurrency` worker threads
+    errors = []
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            ok = request_fn(i)
+        except Exception as e:
+            ok = False
+            errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            connection.close()
+        return time.perf_counter() - started, ok
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+    return _summarize(outcomes, errors, elapsed, rss.peak)
+
+
+def _arun(request_fn, requests, concurrency):
+    # Async requests, `concurrency` in flight on one event loop, as under ASGI
+    errors = []
+
+    async def run_all():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    ok = await request_fn(i)
+                except Exception as e:
+                    ok = False
+                    errors.append(f"{type(e).__name__}: {e}")
+                return time.perf_counter() - started, ok
+
+        return await asyncio.gather(*(timed(i) for i in range(requests)))
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        outcomes = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+    return _summarize(outcomes, errors, elapsed, rss.peak)
+
+
+def bench_session_creation(user, pages, requests, concurrency, specifications=None):
+    pdf_url = f"https://standin.invalid/{pages}-pages.pdf"
+    StandInFileTranslator.pdfs[pdf_url] = make_pdf(pages, *StandInFileTranslator.page_size)
+    if not StandInFileTranslator.render_pages:
+        StandInFileTranslator.prepare_pages(pages)
+
+    def create_session(i):
+        # POST enqueues the job; the worker side is run inline so latency covers both
+        request = _factory.post("/api/user-sessions/", {"pdf_public_url": pdf_url, "specifications": specifications or {}}, format="json")
+        force_authenticate(request, user=user)
+        response = _create_view(request)
+        if response.status_code != 202:
+            return False
+        job = SessionJob.objects.select_related("user").get(id=response.data["job_id"])
+        SessionJob.objects.filter(id=job.id).update(status=SessionJob.Status.RUNNING)
+        job = run_job(job)
+        if job.status != SessionJob.Status.SUCCEEDED:
+            raise RuntimeError(job.error)
+        return True
+
+    return _run(create_session, requests, concurrency)
+
+
+def make_chat_session(user, pages, words_per_page=250):
+    ocr_text = "\n".join(filler_text(words_per_page, seed=page) for page in range(pages))
+    session = UserSession.objects.create(user=user, session_name=f"benchmark {pages} pages", ocr_text=ocr_text)
+    ChatSessions.objects.create(session=session)
+    return session
+
+
+def bench_chat(user, session, requests, concurrency):
+    token = f"Bearer {AccessToken.for_user(user)}"
+
+    async def chat_turn(i):
+        request = _async_factory.put(
+            f"/api/user_sessions/{session.id}/chat-sessions/",
+            json.dumps({"user_query": f"question {i}: {filler_text(12, seed=i)}"}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=token,
+        )
+        response = await _chat_view(request, session_id=session.id)
+        if response.status_code != 200:
+            raise RuntimeError(str(response.data))
+        return True
+
+    return _arun(chat_turn, requests, concurrency)
+
+
+def measure_payload(encode, image):
+    started = time.perf_counter()
+    data = encode(image)
+    elapsed = time.perf_counter() - started
+    with Image.open(BytesIO(data)) as encoded:
+        size = encoded.size
+    return {
+        "bytes": len(data),
+        "base64_bytes": len(base64.b64encode(data)),
+        "encode_ms": round(elapsed * 1000, 2),
+        "width": size[0],
+        "height": size[1],
+        "vision_tokens": vision_tokens(*size),
+    }
+
+
+def compare(results, baseline):
+    # Relative change per matching scenario; positive latency/memory deltas are regressions
+    baseline_rows = {(row["scenario"], row["pages"], row["concurrency"]): row for row in baseline.get("results", [])}
+    comparison = []
+    for row in results:
+        base = baseline_rows.get((row["scenario"], row["pages"], row["concurrency"]))
+        if base is None:
+            continue
+        deltas = {}
+        for metric in ("p50_ms", "p95_ms", "throughput_rps", "peak_rss_mb"):
+            if base.get(metric):
+                deltas[metric] = round((row[metric] - base[metric]) / base[metric] * 100, 1)
+        comparison.append({"scenario": row["scenario"], "pages": row["pages"], "concurrency": row["concurrency"], "delta_pct": deltas})
+    return comparison
+
+
+def is_regression(delta_pct, threshold):
+    return (
+        delta_pct.get("p95_ms", 0) > threshold
+        or delta_pct.get("p50_ms", 0) > threshold
+        or delta_pct.get("throughput_rps", 0) < -threshold
+    )
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,118 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from config.config import chat_history_window, chat_summary_max_tokens
+from services.cache import answer_cache
+from services.clients import run_blocking
+from services.metrics import answer_cache_lookups
+from services.prompting import document_budget, fit_chunks, format_history, history_budget, split_history
+from services.retrieval import build_index, get_embedder, is_current_index, rank_chunks
+
+# Chat turns run on the event loop: LLM calls are awaited, DB work goes through
+# sync_to_async and other blocking work (embeddings, cache lookups) through run_blocking.
+
+
+def _hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def ensure_index(session_data, embedder):
+    # Sessions created before retrieval existed (or under another embedder) are indexed lazily
+    if not is_current_index(session_data.document_embeddings, embedder):
+        session_data.document_embeddings = build_index(session_data.ocr_text, embedder)
+        session_data.save(update_fields=['document_embeddings'])
+
+
+async def fold_history(chat_session, bot, through_sequence):
+    # Folds every turn after summary_through up to through_sequence into the rolling
+    # summary, a window's worth of turns per summary call
+    while chat_session.summary_through < through_sequence:
+        turns = await sync_to_async(chat_session.history_between)(chat_session.summary_through, through_sequence, chat_history_window)
+        if not turns:
+            break
+        summary = await bot.asummarize_conversation(chat_session.history_summary, turns, max_tokens=chat_summary_max_tokens)
+        if not await sync_to_async(chat_session.fold_into_summary)(summary, turns[-1]['sequence']):
+            # A concurrent turn folded further; pick up its summary and continue from there
+            await sync_to_async(chat_session.refresh_from_db)(fields=['history_summary', 'summary_through'])
+
+
+async def build_history_context(chat_session, bot):
+    budget = history_budget()
+    # One turn beyond the window tells whether older turns are still unsummarized
+    turns = await sync_to_async(chat_session.recent_history)(chat_history_window + 1, after_sequence=chat_session.summary_through)
+    overflow = len(turns) > chat_history_window
+    turns = turns[-chat_history_window:]
+    kept, dropped = split_history(turns, budget)
+
+    if dropped or overflow:
+        # Fold down to half the window and budget so the next few turns fit without
+        # another summary call
+        kept, _ = split_history(turns[-max(1, chat_history_window // 2):], budget // 2)
+        through_sequence = kept[0]['sequence'] - 1 if kept else turns[-1]['sequence']
+        await fold_history(chat_session, bot, through_sequence)
+
+    return format_history(chat_session.history_summary, kept)
+
+
+async def build_document_context(chat_session, user_query, history_context):
+    embedder = get_embedder()
+    # Indexing a document and embedding the query may be remote calls, so they run on a
+    # worker thread rather than the single thread shared by sync_to_async
+    await run_blocking(ensure_index, chat_session.session, embedder)
+    ranked_chunks = await run_blocking(rank_chunks, chat_session.session.document_embeddings, user_query, embedder=embedder)
+    return fit_chunks(ranked_chunks, document_budget(user_query, history_context))
+
+
+def is_first_turn(chat_session):
+    # Decided from the stored turns: the formatted history is never empty
+    return chat_session.message_count <= chat_session.summary_through and not chat_session.history_summary
+
+
+def chat_cache_key(chat_session, user_query):
+    # A follow-up's answer depends on the conversation so far, so only first turns are
+    # cached (None otherwise). They are keyed on the document text and the question alone
+    # and shared by every session built from that document; answer_cache_lookups_total
+    # gives the hit rate, with follow-ups counted separately.
+    if not is_first_turn(chat_session):
+        return None
+    return _hash(chat_session.session.ocr_text), user_query
+
+
+def lookup_cached_answer(cache_key):
+    if cache_key is None:
+        answer_cache_lookups.inc(result="follow_ups")
+        return None
+    return answer_cache.get(*cache_key, embedder=get_embedder())
+
+
+def store_cached_answer(cache_key, response):
+    if cache_key is not None:
+        answer_cache.set(*cache_key, response, embedder=get_embedder())
+
+
+async def prepare_chat_turn(chat_session, user_query, bot, use_cache=True):
+    # Shared by the JSON and streaming endpoints. Returns (cache_key, cached_response,
+    # context_doc, history_context); on a cache hit only the first two are set.
+    if not chat_session.session.ocr_text:
+        raise ValueError("Context document is required for chatbot interaction.")
+
+    cache_key = chat_cache_key(chat_session, user_query)
+    if use_cache:
+        cached_response = await run_blocking(lookup_cached_answer, cache_key)
+        if cached_response is not None:
+            return cache_key, cached_response, None, None
+
+    history_context = await build_history_context(chat_session, bot)
+    context_doc = await build_document_context(chat_session, user_query, history_context)
+    return cache_key, None, context_doc, history_context
+
+
+async def answer_chat_turn(chat_session, user_query, bot, use_cache=True):
+    # Returns (response, cached)
+    cache_key, response, context_doc, history_context = await prepare_chat_turn(chat_session, user_query, bot, use_cache)
+    if response is not None:
+        return response, True
+
+    response = await bot.arag_chatbot(user_query, context_doc, prev_chat_context=history_context)
+    if use_cache:
+        await run_blocking(store_cached_answer, cache_key, response)
+    return response, False
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from django.db import connection, transaction
+from django.utils import timezone
+from config.config import session_job_workers, session_jobs_in_process, session_job_stale_seconds
+from services.chatbot import PageOCRError
+from .models import SessionJob
+from .pipeline import create_user_session
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, session_job_workers), thread_name_prefix='session-job')
+        return _executor
+
+
+def enqueue_session_job(user, pdf_public_url, specifications=None):
+    job = SessionJob.objects.create(user=user, pdf_public_url=pdf_public_url, specifications=specifications)
+    # With SESSION_JOBS_IN_PROCESS disabled the job just waits in the table for
+    # `manage.py run_session_jobs` to pick it up.
+    if session_jobs_in_process:
+        transaction.on_commit(lambda: _get_executor().submit(run_pending_jobs))
+    return job
+
+
+def _stale_running_jobs():
+    # RUNNING jobs whose worker stopped reporting progress, e.g. after a restart
+    cutoff = timezone.now() - timedelta(seconds=session_job_stale_seconds)
+    return SessionJob.objects.filter(status=SessionJob.Status.RUNNING, updated_at__lt=cutoff)
+
+
+def retry_session_job(job):
+    # Failed and stale jobs can be retried. Pages checkpointed by the earlier run are
+    # kept; the rerun only redoes the rest
+    retryable = SessionJob.objects.filter(id=job.id, status=SessionJob.Status.FAILED) | _stale_running_jobs().filter(id=job.id)
+    claimed = retryable.update(
+        status=SessionJob.Status.PENDING, stage='queued', error=None, finished_at=None, updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+    job.refresh_from_db()
+    if session_jobs_in_process:
+        transaction.on_commit(lambda: _get_executor().submit(run_pending_jobs))
+    return True
+
+
+def requeue_stale_jobs():
+    return _stale_running_jobs().update(
+        status=SessionJob.Status.PENDING, stage='queued', updated_at=timezone.now()
+    )
+
+
+def claim_next_job():
+    with transaction.atomic():
+        jobs = SessionJob.objects.filter(status=SessionJob.Status.PENDING).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        job_id = jobs.values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        # The conditional update keeps the claim safe on backends without SKIP LOCKED
+        claimed = SessionJob.objects.filter(id=job_id, status=SessionJob.Status.PENDING).update(
+            status=SessionJob.Status.RUNNING, stage='starting', started_at=timezone.now(), updated_at=timezone.now()
+        )
+    if not claimed:
+        return claim_next_job()
+    return SessionJob.objects.select_related('user').get(id=job_id)
+
+
+def run_job(job):
+    def progress(stage, current=0, total=0):
+        SessionJob.objects.filter(id=job.id).update(
+            stage=stage, progress_current=current, progress_total=total, updated_at=timezone.now()
+        )
+
+    try:
+        session = create_user_session(job.user, job.pdf_public_url, job.specifications, progress=progress, job=job)
+    except PageOCRError as e:
+        job.status, job.error = SessionJob.Status.FAILED, {"error": str(e), "failed_pages": e.failures}
+    except Exception as e:
+        job.status, job.error = SessionJob.Status.FAILED, {"error": f"Failed to create session: {str(e)}"}
+    else:
+        job.status, job.session, job.stage = SessionJob.Status.SUCCEEDED, session, 'done'
+    job.finished_at = timezone.now()
+    # A failed job keeps the stage its last progress update recorded
+    update_fields = ['status', 'error', 'session', 'finished_at', 'updated_at']
+    if job.status == SessionJob.Status.SUCCEEDED:
+        update_fields.append('stage')
+    job.save(update_fields=update_fields)
+    return job
+
+
+def run_pending_jobs():
+    processed = 0
+    try:
+        # Jobs left RUNNING by a worker that died are picked up again here, so the
+        # in-process executor recovers them too, not only `manage.py run_session_jobs`
+        requeue_stale_jobs()
+        while True:
+            job = claim_next_job()
+            if job is None:
+                return processed
+            run_job(job)
+            processed += 1
+    finally:
+        connection.close()
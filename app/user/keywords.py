@@ -0,0 +1,26 @@
+import re
+
+KEYWORD_MAX_LENGTH = 100
+# Bullets and list numbering the model puts in front of keywords ("- ", "* ", "• ", "1. ", "2) ")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•·]+|\d+[.)])\s*")
+_LABEL_RE = re.compile(r"^\s*(?:top\s+)?keywords?\s*:\s*", re.IGNORECASE)
+
+
+def normalize_keyword(keyword):
+    keyword = _BULLET_RE.sub("", keyword)
+    keyword = keyword.strip().strip("\"'`*_.").lower()
+    return " ".join(keyword.split())[:KEYWORD_MAX_LENGTH]
+
+
+def parse_keywords(text):
+    # keywords_extraction answers either as a comma list or as bullets; accept both
+    if not text:
+        return []
+    names = []
+    for line in str(text).splitlines():
+        line = _LABEL_RE.sub("", line)
+        for part in re.split(r"[,;]", line):
+            name = normalize_keyword(part)
+            if name and name not in names:
+                names.append(name)
+    return names
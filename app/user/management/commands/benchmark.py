@@ -0,0 +1,127 @@
+import json
+import os
+import platform
+import tempfile
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from services.standins import Latency, StandInFileTranslator, configure_standins
+from user.benchmark import bench_chat, bench_session_creation, compare, is_regression, load_baseline, make_chat_session, standin_patches
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = "Benchmark session creation and chat turns against offline Azure/Appwrite stand-ins on a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=['all', 'create', 'chat'], default='all')
+        parser.add_argument('--pages', type=_int_list, default=[1, 4, 16], help="Comma-separated PDF sizes in pages.")
+        parser.add_argument('--concurrency', type=_int_list, default=[1, 4], help="Comma-separated concurrency levels.")
+        parser.add_argument('--requests', type=int, default=8, help="Requests per scenario.")
+        parser.add_argument('--llm-latency', type=float, default=0.5, help="Mean seconds per chat/transform completion.")
+        parser.add_argument('--ocr-latency', type=float, default=1.0, help="Mean seconds per page OCR call.")
+        parser.add_argument('--storage-latency', type=float, default=0.1, help="Mean seconds per Appwrite upload.")
+        parser.add_argument('--download-latency', type=float, default=0.2, help="Mean seconds for the PDF download.")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- jitter as a fraction of each mean.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Probability that any stand-in call fails.")
+        parser.add_argument('--ocr-words', type=int, default=250, help="Words returned per OCR'd page.")
+        parser.add_argument('--page-size', default='1240x1754', help="Page image size as WIDTHxHEIGHT.")
+        parser.add_argument('--no-render', action='store_true', help="Skip poppler and use synthetic page images.")
+        parser.add_argument('--cache', action='store_true', help="Leave the OCR and answer caches enabled.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write results as JSON to this path.")
+        parser.add_argument('--baseline', help="Compare against a previous --output file.")
+        parser.add_argument('--max-regression', type=float, help="Exit non-zero if p50/p95 or throughput regress by more than this many percent.")
+
+    def _latency(self, mean, options):
+        return Latency(mean, mean * options['jitter'], options['error_rate'], options['seed'])
+
+    def handle(self, *args, **options):
+        try:
+            width, height = (int(part) for part in options['page_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError("--page-size must look like 1240x1754.")
+
+        StandInFileTranslator.page_size = (width, height)
+        configure_standins(
+            llm_latency=self._latency(options['llm_latency'], options),
+            ocr_latency=self._latency(options['ocr_latency'], options),
+            storage_latency=self._latency(options['storage_latency'], options),
+            download_latency=self._latency(options['download_latency'], options),
+            ocr_words=options['ocr_words'],
+            render_pages=False if options['no_render'] else None,
+        )
+        if not StandInFileTranslator.render_pages and not options['no_render']:
+            self.stderr.write("pdftoppm not found; rendering synthetic page images instead.")
+
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # The default in-memory shared-cache test DB fails concurrent writers with
+            # "table is locked" instead of waiting, so benchmark on a temp file whose
+            # transactions take the write lock up front
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark.sqlite3')
+            connection.settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=30)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with standin_patches(use_cache=options['cache']):
+                results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "settings": {key: options[key] for key in (
+                'requests', 'llm_latency', 'ocr_latency', 'storage_latency', 'download_latency',
+                'jitter', 'error_rate', 'ocr_words', 'page_size', 'cache', 'seed',
+            )},
+            "rendered_pages": StandInFileTranslator.render_pages,
+            "results": results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if options['baseline']:
+            self._compare(results, load_baseline(options['baseline']), options['max_regression'])
+
+    def _run(self, options):
+        user = User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+        results = []
+        self.stdout.write(f"{'scenario':<10}{'pages':>6}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>9}{'errors':>8}{'rss MB':>9}")
+        for pages in options['pages']:
+            session = make_chat_session(user, pages, options['ocr_words'])
+            for concurrency in options['concurrency']:
+                if options['scenario'] in ('all', 'create'):
+                    row = bench_session_creation(user, pages, options['requests'], concurrency)
+                    results.append(self._report('create', pages, concurrency, row))
+                if options['scenario'] in ('all', 'chat'):
+                    row = bench_chat(user, session, options['requests'], concurrency)
+                    results.append(self._report('chat', pages, concurrency, row))
+        return results
+
+    def _report(self, scenario, pages, concurrency, row):
+        row = {"scenario": scenario, "pages": pages, "concurrency": concurrency, **row}
+        self.stdout.write(
+            f"{scenario:<10}{pages:>6}{concurrency:>6}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+            f"{row['throughput_rps']:>9.2f}{row['errors']:>8}{row['peak_rss_mb']:>9.1f}"
+        )
+        return row
+
+    def _compare(self, results, baseline, max_regression):
+        regressions = 0
+        for row in compare(results, baseline):
+            deltas = ", ".join(f"{metric} {delta:+.1f}%" for metric, delta in row['delta_pct'].items())
+            self.stdout.write(f"{row['scenario']} pages={row['pages']} concurrency={row['concurrency']}: {deltas}")
+            if max_regression is not None and is_regression(row['delta_pct'], max_regression):
+                regressions += 1
+        if regressions:
+            raise CommandError(f"{regressions} scenario(s) regressed by more than {max_regression}%.")
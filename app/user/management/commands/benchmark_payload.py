@@ -0,0 +1,69 @@
+import json
+from io import BytesIO
+from django.core.management.base import BaseCommand, CommandError
+from pdf2image import convert_from_path
+from config.config import pdf_render_dpi
+from services.imaging import encode_page
+from services.standins import can_render_pdfs, make_page_image
+from user.benchmark import measure_payload
+
+LEGACY_DPI = 300
+
+
+def legacy_encode(image):
+    # What iter_page_jpegs sent before preprocessing: a default-quality color JPEG
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Compare per-page OCR payloads before and after page preprocessing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdfs', nargs='*', help="PDF files to measure; synthetic notebook pages are used when omitted.")
+        parser.add_argument('--pages', type=int, default=4, help="Synthetic pages to generate.")
+        parser.add_argument('--max-pages', type=int, default=20, help="Pages measured per PDF.")
+        parser.add_argument('--output', help="Write per-page results as JSON to this path.")
+
+    def _pages(self, options):
+        # Yields (label, legacy render, preprocessing render) per page
+        if not options['pdfs']:
+            legacy_size = (int(8.27 * LEGACY_DPI), int(11.69 * LEGACY_DPI))  # A4 at 300 dpi
+            for page in range(options['pages']):
+                image = make_page_image(*legacy_size, seed=page)
+                yield f"synthetic:{page + 1}", image, image
+            return
+
+        if not can_render_pdfs():
+            raise CommandError("Rendering PDFs needs poppler (pdftoppm) on PATH.")
+        for path in options['pdfs']:
+            legacy_pages = convert_from_path(path, dpi=LEGACY_DPI, last_page=options['max_pages'])
+            pages = convert_from_path(path, dpi=pdf_render_dpi, last_page=options['max_pages'])
+            for number, (legacy, image) in enumerate(zip(legacy_pages, pages), start=1):
+                yield f"{path}:{number}", legacy, image
+
+    def handle(self, *args, **options):
+        rows = []
+        self.stdout.write(f"{'page':<28}{'before KB':>11}{'after KB':>10}{'saved':>8}{'tokens':>14}{'encode ms':>11}")
+        for label, legacy, image in self._pages(options):
+            before = measure_payload(legacy_encode, legacy)
+            after = measure_payload(encode_page, image)
+            rows.append({"page": label, "before": before, "after": after})
+            self.stdout.write(
+                f"{label[-28:]:<28}{before['base64_bytes'] / 1024:>11.1f}{after['base64_bytes'] / 1024:>10.1f}"
+                f"{1 - after['base64_bytes'] / before['base64_bytes']:>8.0%}"
+                f"{before['vision_tokens']:>7}->{after['vision_tokens']:<6}{after['encode_ms']:>11.1f}"
+            )
+
+        if rows:
+            before_total = sum(row['before']['base64_bytes'] for row in rows)
+            after_total = sum(row['after']['base64_bytes'] for row in rows)
+            self.stdout.write(
+                f"{len(rows)} page(s): {before_total / 1024:.0f} KB -> {after_total / 1024:.0f} KB base64 "
+                f"({1 - after_total / before_total:.0%} smaller)"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({"render_dpi": pdf_render_dpi, "legacy_dpi": LEGACY_DPI, "pages": rows}, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_sessionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedCompletion',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('value', models.TextField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cached Completion',
+                'verbose_name_plural': 'Cached Completions',
+                'indexes': [models.Index(fields=['kind', 'last_used_at'], name='user_cached_kind_d1b994_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+def move_transformed_documents(apps, schema_editor):
+    # document_embeddings used to hold the transformed document text; it now holds the
+    # retrieval index, which is rebuilt lazily on the next chat turn.
+    UserSession = apps.get_model('user', 'UserSession')
+    for session in UserSession.objects.exclude(document_embeddings=None).only('id', 'document_embeddings').iterator():
+        transformed = session.document_embeddings if isinstance(session.document_embeddings, str) else None
+        UserSession.objects.filter(id=session.id).update(transformed_document=transformed, document_embeddings=None)
+
+
+def restore_transformed_documents(apps, schema_editor):
+    UserSession = apps.get_model('user', 'UserSession')
+    for session in UserSession.objects.exclude(transformed_document=None).only('id', 'transformed_document').iterator():
+        UserSession.objects.filter(id=session.id).update(document_embeddings=session.transformed_document)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_cachedcompletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='transformed_document',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_transformed_documents, restore_transformed_documents),
+    ]
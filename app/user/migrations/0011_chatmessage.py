@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0010_usersession_transformed_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsessions',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('user_query', models.TextField()),
+                ('response', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('chat_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='user.chatsessions')),
+            ],
+            options={
+                'ordering': ['chat_session', 'sequence'],
+                'constraints': [models.UniqueConstraint(fields=('chat_session', 'sequence'), name='unique_chat_message_sequence')],
+            },
+        ),
+    ]
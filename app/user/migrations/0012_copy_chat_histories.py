@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:46
+
+from django.db import migrations
+
+# Data only: on PostgreSQL a schema change in the same transaction as these writes fails
+# with "pending trigger events", so dropping chat_history is left to the next migration
+
+
+def explode_chat_histories(apps, schema_editor):
+    ChatSessions = apps.get_model('user', 'ChatSessions')
+    ChatMessage = apps.get_model('user', 'ChatMessage')
+    for chat_session in ChatSessions.objects.exclude(chat_history=None).iterator():
+        history = [entry for entry in chat_session.chat_history or [] if isinstance(entry, dict)]
+        ChatMessage.objects.bulk_create([
+            ChatMessage(
+                chat_session=chat_session,
+                sequence=sequence,
+                user_query=entry.get('user_query') or '',
+                response=entry.get('response'),
+            )
+            for sequence, entry in enumerate(history, start=1)
+        ], batch_size=500)
+        ChatSessions.objects.filter(id=chat_session.id).update(message_count=len(history))
+
+
+def rebuild_chat_histories(apps, schema_editor):
+    ChatSessions = apps.get_model('user', 'ChatSessions')
+    ChatMessage = apps.get_model('user', 'ChatMessage')
+    for chat_session in ChatSessions.objects.iterator():
+        history = list(
+            ChatMessage.objects.filter(chat_session=chat_session).order_by('sequence').values('user_query', 'response')
+        )
+        ChatSessions.objects.filter(id=chat_session.id).update(chat_history=history)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0011_chatmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(explode_chat_histories, rebuild_chat_histories),
+    ]
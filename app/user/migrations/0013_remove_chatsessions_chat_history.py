@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_copy_chat_histories'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chatsessions',
+            name='chat_history',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0013_remove_chatsessions_chat_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsessions',
+            name='history_summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chatsessions',
+            name='summary_through',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:49
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+# Data only: on PostgreSQL the ALTER TABLE that makes chat sessions one-to-one fails with
+# "pending trigger events" in the same transaction as these writes, so it runs in the next migration
+
+
+def merge_duplicate_chat_sessions(apps, schema_editor):
+    # Keep the oldest chat session per UserSession and append the others' messages to it
+    ChatSessions = apps.get_model('user', 'ChatSessions')
+    ChatMessage = apps.get_model('user', 'ChatMessage')
+    duplicated = ChatSessions.objects.values('session_id').annotate(total=Count('id')).filter(total__gt=1)
+    for row in duplicated:
+        keeper, *extras = ChatSessions.objects.filter(session_id=row['session_id']).order_by('id')
+        sequence = ChatMessage.objects.filter(chat_session=keeper).aggregate(last=Max('sequence'))['last'] or 0
+        for extra in extras:
+            for message in ChatMessage.objects.filter(chat_session=extra).order_by('sequence'):
+                sequence += 1
+                ChatMessage.objects.filter(id=message.id).update(chat_session=keeper, sequence=sequence)
+            extra.delete()
+        ChatSessions.objects.filter(id=keeper.id).update(message_count=sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_chatsessions_history_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_chat_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_merge_duplicate_chat_sessions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatsessions',
+            name='session',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='chat_session', to='user.usersession'),
+        ),
+        migrations.AddIndex(
+            model_name='usersession',
+            index=models.Index(fields=['user', '-last_activity'], name='usersession_user_activity_idx'),
+        ),
+    ]
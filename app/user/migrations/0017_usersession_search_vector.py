@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:52
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from config.config import search_config
+
+
+def create_search_index(apps, schema_editor):
+    # tsvector and GIN only exist on Postgres; other backends (SQLite in tests) use the
+    # LIKE-based fallback in user.search and leave search_vector empty.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS usersession_search_gin ON user_usersession USING gin (search_vector)"
+    )
+    UserSession = apps.get_model('user', 'UserSession')
+    UserSession.objects.update(search_vector=(
+        SearchVector('session_name', weight='A', config=search_config)
+        + SearchVector('session_keywords', weight='B', config=search_config)
+        + SearchVector('ocr_text', weight='C', config=search_config)
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS usersession_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0016_session_indexes_and_unique_chat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
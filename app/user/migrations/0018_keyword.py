@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+def backfill_keywords(apps, schema_editor):
+    from user.keywords import parse_keywords
+    Keyword = apps.get_model('user', 'Keyword')
+    UserSession = apps.get_model('user', 'UserSession')
+    sessions = UserSession.objects.exclude(session_keywords__isnull=True).exclude(session_keywords='')
+    for session in sessions.only('id', 'session_keywords').iterator():
+        names = parse_keywords(session.session_keywords)
+        Keyword.objects.bulk_create([Keyword(name=name) for name in names], ignore_conflicts=True)
+        session.keywords.set(Keyword.objects.filter(name__in=names))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0017_usersession_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Keyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='usersession',
+            name='keywords',
+            field=models.ManyToManyField(blank=True, related_name='sessions', to='user.keyword'),
+        ),
+        migrations.RunPython(backfill_keywords, migrations.RunPython.noop),
+    ]
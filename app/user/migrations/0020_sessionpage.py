@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0019_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('image_url', models.TextField(blank=True, null=True)),
+                ('image_hash', models.CharField(blank=True, max_length=64)),
+                ('ocr_text', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('done', 'Done'), ('failed', 'Failed')], max_length=20)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pages', to='user.sessionjob')),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='user.usersession')),
+            ],
+            options={
+                'verbose_name': 'Session Page',
+                'verbose_name_plural': 'Session Pages',
+                'ordering': ['page_number'],
+                'constraints': [models.UniqueConstraint(fields=('job', 'page_number'), name='unique_job_page'), models.UniqueConstraint(fields=('session', 'page_number'), name='unique_session_page')],
+            },
+        ),
+    ]
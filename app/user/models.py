@@ -1,8 +1,12 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import date
+from config.config import search_config
+from .keywords import parse_keywords
 
 user = get_user_model()
 
@@ -14,6 +18,24 @@ class UserProfile(models.Model):
     email =  models.EmailField(unique=True, blank=True, null=True)
 
 
+class Keyword(models.Model):
+    name = models.CharField(max_length=100, unique=True)  # normalized by user.keywords.normalize_keyword
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+def session_search_vector():
+    return (
+        SearchVector('session_name', weight='A', config=search_config)
+        + SearchVector('session_keywords', weight='B', config=search_config)
+        + SearchVector('ocr_text', weight='C', config=search_config)
+    )
+
+
 class UserSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
     session_name = models.CharField(max_length=225)
@@ -21,12 +43,63 @@ class UserSession(models.Model):
     session_keywords = models.TextField(blank=True, null=True)
     pdf_image_urls = models.TextField(blank=True, null=True)
     ocr_text = models.TextField(blank=True, null=True)
-    document_embeddings = models.JSONField(blank=True, null=True)
+    transformed_document = models.TextField(blank=True, null=True)
+    document_embeddings = models.JSONField(blank=True, null=True)  # retrieval index built by services.retrieval
     last_activity = models.DateTimeField(default=timezone.now)
+    search_vector = SearchVectorField(blank=True, null=True)  # Postgres only; GIN-indexed in migration 0017
+    keywords = models.ManyToManyField(Keyword, blank=True, related_name='sessions')
+
+    SEARCH_FIELDS = ('session_name', 'session_keywords', 'ocr_text')
 
     def __str__(self):
         return f"{self.user.username} - {self.session_name} - {self.last_activity.strftime('%Y-%m-%d %H:%M:%S')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self, fields):
+        # Fields whose value differs from what was loaded from (or last saved to) the DB
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(fields)
+        deferred = self.get_deferred_fields()
+        return {
+            field for field in fields
+            if field not in deferred and (field not in loaded or loaded[field] != getattr(self, field))
+        }
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # search_vector is maintained by the UPDATE below; a stale in-memory value must
+            # never be written back over it
+            deferred = self.get_deferred_fields()
+            update_fields = kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'search_vector' and field.attname not in deferred
+            ]
+        search_fields = self.SEARCH_FIELDS if update_fields is None else [field for field in self.SEARCH_FIELDS if field in update_fields]
+        changed = self.changed_fields(search_fields)
+        super().save(*args, **kwargs)
+
+        if update_fields is None:
+            saved_fields = [field.attname for field in self._meta.concrete_fields if field.attname not in self.get_deferred_fields()]
+        else:
+            saved_fields = [self._meta.get_field(name).attname for name in update_fields]
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **{field: getattr(self, field) for field in saved_fields}}
+        if changed and connections[self._state.db].vendor == 'postgresql':
+            UserSession.objects.using(self._state.db).filter(pk=self.pk).update(search_vector=session_search_vector())
+        if 'session_keywords' in changed:
+            self.sync_keywords()
+
+    def sync_keywords(self):
+        names = parse_keywords(self.session_keywords)
+        Keyword.objects.bulk_create([Keyword(name=name) for name in names], ignore_conflicts=True)
+        self.keywords.set(Keyword.objects.filter(name__in=names))
+
     def __repr__(self):
         return f"<UserSession user={self.user.username} session_name={self.session_name}>"
 
@@ -34,7 +107,158 @@ class UserSession(models.Model):
         verbose_name = "User Session"
         verbose_name_plural = "User Sessions"
         ordering = ['-last_activity']
+        indexes = [
+            models.Index(fields=['user', '-last_activity'], name='usersession_user_activity_idx'),
+        ]
 
 class ChatSessions(models.Model):
-    session = models.ForeignKey(UserSession, on_delete=models.CASCADE, related_name='chat_sessions')
-    chat_history = models.JSONField(blank=True, null=True)
\ No newline at end of file
+    session = models.OneToOneField(UserSession, on_delete=models.CASCADE, related_name='chat_session')
+    message_count = models.PositiveIntegerField(default=0)
+    history_summary = models.TextField(blank=True, default='')
+    summary_through = models.PositiveIntegerField(default=0)  # last message sequence folded into history_summary
+
+    def append_message(self, user_query, response):
+        with transaction.atomic():
+            # The counter UPDATE row-locks this chat session, so concurrent turns get
+            # distinct sequence numbers instead of overwriting each other.
+            ChatSessions.objects.filter(pk=self.pk).update(message_count=F('message_count') + 1)
+            sequence = ChatSessions.objects.filter(pk=self.pk).values_list('message_count', flat=True).get()
+            message = ChatMessage.objects.create(chat_session=self, sequence=sequence, user_query=user_query, response=response)
+        self.message_count = sequence
+        return message
+
+    def recent_history(self, limit=15, after_sequence=0):
+        messages = self.messages.filter(sequence__gt=after_sequence).order_by('-sequence')
+        return list(reversed(messages.values('sequence', 'user_query', 'response')[:limit]))
+
+    def history_between(self, after_sequence, through_sequence, limit=None):
+        # Turns with after_sequence < sequence <= through_sequence, oldest first
+        messages = self.messages.filter(sequence__gt=after_sequence, sequence__lte=through_sequence).order_by('sequence')
+        return list(messages.values('sequence', 'user_query', 'response')[:limit])
+
+    def fold_into_summary(self, summary, through_sequence):
+        # Only move the summary forward; a concurrent turn may already have folded further
+        updated = ChatSessions.objects.filter(pk=self.pk, summary_through__lt=through_sequence).update(
+            history_summary=summary, summary_through=through_sequence
+        )
+        if updated:
+            self.history_summary, self.summary_through = summary, through_sequence
+        return bool(updated)
+
+
+class ChatMessage(models.Model):
+    chat_session = models.ForeignKey(ChatSessions, on_delete=models.CASCADE, related_name='messages')
+    sequence = models.PositiveIntegerField()
+    user_query = models.TextField()
+    response = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.chat_session_id} - #{self.sequence}"
+
+    class Meta:
+        ordering = ['chat_session', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['chat_session', 'sequence'], name='unique_chat_message_sequence'),
+        ]
+
+class SessionJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='session_jobs')
+    pdf_public_url = models.TextField()
+    specifications = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    stage = models.CharField(max_length=50, default='queued')
+    progress_current = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    error = models.JSONField(blank=True, null=True)
+    session = models.ForeignKey(UserSession, on_delete=models.SET_NULL, blank=True, null=True, related_name='jobs')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.user.username} - job {self.pk} - {self.status}"
+
+    class Meta:
+        verbose_name = "Session Job"
+        verbose_name_plural = "Session Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class SessionPage(models.Model):
+    # One row per PDF page, checkpointed by the job as each page finishes so a failed or
+    # interrupted job can resume with only the missing pages
+    class Status(models.TextChoices):
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    session = models.ForeignKey(UserSession, on_delete=models.CASCADE, blank=True, null=True, related_name='pages')
+    job = models.ForeignKey(SessionJob, on_delete=models.SET_NULL, blank=True, null=True, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    image_url = models.TextField(blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True)
+    ocr_text = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Status.choices)
+    error = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"page {self.page_number} - {self.status}"
+
+    def as_result(self):
+        # The page dict services.pipeline resumes from
+        return {"image_url": self.image_url, "image_hash": self.image_hash, "ocr_text": self.ocr_text, "error": self.error}
+
+    class Meta:
+        verbose_name = "Session Page"
+        verbose_name_plural = "Session Pages"
+        ordering = ['page_number']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'page_number'], name='unique_job_page'),
+            models.UniqueConstraint(fields=['session', 'page_number'], name='unique_session_page'),
+        ]
+
+
+class CachedCompletion(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    kind = models.CharField(max_length=20)
+    value = models.TextField()
+    size = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} - {self.key}"
+
+    class Meta:
+        verbose_name = "Cached Completion"
+        verbose_name_plural = "Cached Completions"
+        indexes = [
+            models.Index(fields=['kind', 'last_used_at']),
+        ]
+
+
+class RateLimitBucket(models.Model):
+    # Token bucket state per Azure deployment, shared by every worker (services/scheduler.py)
+    name = models.CharField(max_length=100, primary_key=True)
+    tokens = models.FloatField(default=0)
+    requests = models.FloatField(default=0)
+    updated_at = models.FloatField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Rate Limit Bucket"
+        verbose_name_plural = "Rate Limit Buckets"
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserSessionCursorPagination(CursorPagination):
+    # Keyset pagination on the (user, last_activity) access path; stable while new
+    # sessions are being created, unlike page numbers.
+    ordering = '-last_activity'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,79 @@
+import json
+import time
+from .models import UserSession, ChatSessions, SessionPage
+from services.filetranslator import FileTranslator
+from services.chatbot import AzureChatbot
+from services.metrics import stage_seconds, time_stage
+from services.pipeline import render_upload_and_ocr, run_post_ocr_stage
+
+
+def _no_progress(stage, current=0, total=0):
+    pass
+
+
+def _page_fields(result):
+    return {
+        "image_url": result["image_url"],
+        "image_hash": result["image_hash"],
+        "ocr_text": result["ocr_text"],
+        "status": SessionPage.Status.FAILED if result["error"] else SessionPage.Status.DONE,
+        "error": result["error"],
+    }
+
+
+def checkpoint_page(job, page_number, result):
+    SessionPage.objects.update_or_create(job=job, page_number=page_number, defaults=_page_fields(result))
+
+
+def create_user_session(user, pdf_public_url, specifications=None, progress=None, job=None):
+    # With a job, every page is checkpointed as a SessionPage as soon as it is done and a
+    # rerun of the job only renders, uploads and OCRs the pages still missing
+    progress = progress or _no_progress
+    started = time.perf_counter()
+    file_translator = FileTranslator()
+    bot = AzureChatbot()
+    pages = {}
+
+    def on_page(page_number, result):
+        pages[page_number] = result
+        if job is not None:
+            checkpoint_page(job, page_number, result)
+
+    done_pages = {}
+    if job is not None:
+        done_pages = {page.page_number: page.as_result() for page in SessionPage.objects.filter(job=job)}
+
+    progress("ocr")
+    public_img_urls, ocr_texts = render_upload_and_ocr(
+        pdf_public_url, file_translator, bot,
+        on_progress=lambda done, total: progress("ocr", done, total),
+        done_pages=done_pages, on_page=on_page,
+    )
+
+    progress("post-processing")
+    finalized_text, session_name, session_keywords, document_index = run_post_ocr_stage(bot, ocr_texts, specifications)
+    ocr_text = "\n".join(ocr_texts) if ocr_texts else ""
+
+    progress("saving")
+    with time_stage("save"):
+        user_session = UserSession.objects.create(
+            user=user,
+            session_name=session_name,
+            session_activity=specifications,  # JSONField can take dict directly
+            session_keywords=session_keywords,
+            pdf_image_urls=json.dumps(public_img_urls),
+            ocr_text=ocr_text,
+            transformed_document=finalized_text,
+            document_embeddings=document_index
+        )
+
+        ChatSessions.objects.create(session=user_session)
+        if job is not None:
+            SessionPage.objects.filter(job=job).update(session=user_session)
+        else:
+            SessionPage.objects.bulk_create([
+                SessionPage(session=user_session, page_number=number, **_page_fields(result)) for number, result in sorted(pages.items())
+            ])
+
+    stage_seconds.observe(time.perf_counter() - started, stage="total")
+    return user_session
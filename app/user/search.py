@@ -0,0 +1,88 @@
+import re
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Count, F, Q
+from config.config import search_config
+from .keywords import parse_keywords
+from .models import Keyword, UserSession
+from .serializers import UserSessionListSerializer
+
+HEADLINE_OPTIONS = {'start_sel': '<mark>', 'stop_sel': '</mark>', 'max_words': 35, 'min_words': 15}
+# Fallback ranking weights, mirroring the A/B/C weights of the Postgres search vector
+FIELD_WEIGHTS = {'session_name': 1.0, 'session_keywords': 0.4, 'ocr_text': 0.2}
+
+
+def filter_by_keywords(queryset, keywords, match='any'):
+    # Joins through the indexed keyword table instead of scanning session_keywords with LIKE
+    names = parse_keywords(keywords)
+    if not names:
+        return queryset
+    queryset = queryset.filter(keywords__name__in=names).annotate(matched_keywords=Count('keywords'))
+    if match == 'all':
+        queryset = queryset.filter(matched_keywords=len(names))
+    return queryset
+
+
+def keyword_counts(user):
+    return (
+        Keyword.objects.filter(sessions__user=user)
+        .annotate(session_count=Count('sessions'))
+        .order_by('-session_count', 'name')
+    )
+
+
+def search_sessions(user, query, limit=20):
+    if connection.vendor == 'postgresql':
+        return _search_postgres(user, query, limit)
+    return _search_fallback(user, query, limit)
+
+
+def _search_postgres(user, query, limit):
+    search_query = SearchQuery(query, search_type='websearch', config=search_config)
+    return list(
+        UserSession.objects.filter(user=user, search_vector=search_query)
+        .only(*UserSessionListSerializer.LIST_FIELDS)
+        .annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            headline=SearchHeadline('ocr_text', search_query, config=search_config, **HEADLINE_OPTIONS),
+        )
+        .order_by('-rank', '-last_activity')[:limit]
+    )
+
+
+def _headline(text, terms, width=200):
+    lowered = (text or "").lower()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    if not positions:
+        return (text or "")[:width]
+    start = max(0, min(positions) - width // 4)
+    snippet = text[start:start + width]
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    return pattern.sub(lambda match: f"<mark>{match.group(0)}</mark>", snippet)
+
+
+def _search_fallback(user, query, limit):
+    # Used on non-Postgres backends (SQLite in tests and local runs): every term must
+    # appear in one of the searchable fields; ranking and highlighting happen in Python.
+    terms = [term.lower() for term in re.findall(r"\w+", query)]
+    if not terms:
+        return []
+
+    sessions = UserSession.objects.filter(user=user)
+    for term in terms:
+        sessions = sessions.filter(
+            Q(session_name__icontains=term) | Q(session_keywords__icontains=term) | Q(ocr_text__icontains=term)
+        )
+
+    results = []
+    for session in sessions.only(*UserSessionListSerializer.LIST_FIELDS, 'ocr_text'):
+        session.rank = sum(
+            weight * (getattr(session, field) or "").lower().count(term)
+            for field, weight in FIELD_WEIGHTS.items()
+            for term in terms
+        )
+        session.headline = _headline(session.ocr_text, terms)
+        results.append(session)
+
+    results.sort(key=lambda session: (session.rank, session.last_activity), reverse=True)
+    return results[:limit]
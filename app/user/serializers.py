@@ -5,12 +5,10 @@ from django.utils.encoding import force_bytes
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import UserProfile, UserSession, ChatSessions
-from services.filetranslator import FileTranslator
+from .models import UserProfile, UserSession, ChatSessions, SessionJob, Keyword, SessionPage
 from services.chatbot import AzureChatbot
 from django.core.mail import send_mail
 import random
-import json
 from django.conf import settings
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -117,74 +115,64 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return instance
     
 
-class UserSessionSerializer(serializers.ModelSerializer):
-    pdf_image_urls = serializers.SerializerMethodField()
+class UserSessionListSerializer(serializers.ModelSerializer):
+    # Only reads the columns listed in LIST_FIELDS; the OCR text, transformed document and
+    # retrieval index are left to the detail endpoint.
+    LIST_FIELDS = ['id', 'user_id', 'session_name', 'session_activity', 'session_keywords', 'last_activity']
 
     class Meta:
         model = UserSession
         fields = [
             'id',
-            'user',
             'session_name',
             'session_activity',
             'session_keywords',
-            'pdf_image_urls',
-            'document_embeddings',
             'last_activity',
         ]
-        read_only_fields = ['id', 'last_activity', 'user', 'session_name']
+        read_only_fields = fields
 
-    def get_pdf_image_urls(self, obj):
-        try:
-            return json.loads(obj.pdf_image_urls or "[]")
-        except (TypeError, ValueError):
-            return []
+class UserSessionSearchResultSerializer(UserSessionListSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
 
-    def create(self, validated_data):
-        request = self.context['request']
-        user = request.user
-        pdf_public_url = request.data.get('pdf_public_url')
-        specifications = request.data.get('specifications', {})
-
-        if not pdf_public_url:
-            raise serializers.ValidationError({"pdf_public_url": "This field is required."})
-
-        file_translator = FileTranslator()
-        bot = AzureChatbot()
-
-        try:
-            public_img_urls = file_translator.pdf_to_images_and_store(pdf_public_url)
-            ocr_texts = [bot.image_to_text(url) for url in public_img_urls]
+    class Meta(UserSessionListSerializer.Meta):
+        fields = UserSessionListSerializer.Meta.fields + ['rank', 'headline']
+        read_only_fields = fields
 
-            finalized_text = bot.transform_document(ocr_texts, specifications) if specifications else None
-            session_name = bot.create_session_name(finalized_text or "\n".join(ocr_texts))
-            session_keywords = bot.keywords_extraction(ocr_texts) if ocr_texts else None
+class KeywordCountSerializer(serializers.ModelSerializer):
+    session_count = serializers.IntegerField(read_only=True)
 
-            user_session = UserSession.objects.create(
-                user=user,
-                session_name=session_name,
-                session_activity=specifications,  # JSONField can take dict directly
-                session_keywords=session_keywords,
-                pdf_image_urls=json.dumps(public_img_urls),
-                ocr_text="\n".join(ocr_texts) if ocr_texts else "",
-                document_embeddings=finalized_text or {}
-            )
-
-            ChatSessions.objects.create(
-                session=user_session,
-                chat_history=[]
-            )
+    class Meta:
+        model = Keyword
+        fields = ['name', 'session_count']
+        read_only_fields = fields
 
-            return user_session
+class SessionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
 
-        except Exception as e:
-            raise serializers.ValidationError({"error": f"Failed to create session: {str(e)}"})
+    class Meta:
+        model = SessionJob
+        fields = [
+            'id',
+            'status',
+            'stage',
+            'progress_current',
+            'progress_total',
+            'progress',
+            'error',
+            'session',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
 
-    def update(self, instance, validated_data):
-        instance.session_name = validated_data.get('session_name', instance.session_name)
-        instance.session_activity = validated_data.get('session_activity', instance.session_activity)
-        instance.save()
-        return instance
+    def get_progress(self, obj):
+        if obj.status == SessionJob.Status.SUCCEEDED:
+            return 100
+        if not obj.progress_total:
+            return 0
+        return round(100 * obj.progress_current / obj.progress_total)
 
 class UserSessionDetailSerializer(serializers.ModelSerializer):
     class Meta:
@@ -195,70 +183,50 @@ class UserSessionDetailSerializer(serializers.ModelSerializer):
             'session_name',
             'session_activity',
             'pdf_image_urls',
+            'transformed_document',
             'document_embeddings',
             'last_activity',
         ]
-        read_only_fields = ['id', 'last_activity', 'user']
+        # Derived from the OCR text by the pipeline, never by the client
+        read_only_fields = ['id', 'last_activity', 'user', 'transformed_document', 'document_embeddings']
 
     def update(self, instance, validated_data):
-        bot = AzureChatbot()
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        changed = instance.changed_fields(validated_data)
+
+        # The transformed document depends on the activity spec; a rename leaves it alone
+        if instance.ocr_text and 'session_activity' in changed:
+            # Stored pages let long documents be chunked on real page boundaries
+            page_texts = [text for text in instance.pages.values_list('ocr_text', flat=True) if text is not None]
+            document = page_texts if "\n".join(page_texts) == instance.ocr_text else instance.ocr_text
+            instance.transformed_document = AzureChatbot().transform_document(document, instance.session_activity) if instance.session_activity else None
+            changed.add('transformed_document')
+
+        if changed:
+            instance.save(update_fields=sorted(changed))
+        return instance
 
-        instance.session_name = validated_data.get('session_name', instance.session_name)
-        instance.session_activity = validated_data.get('session_activity', instance.session_activity)
-        ocr_text = instance.ocr_text or validated_data.get('ocr_text', None)
 
-        # Generate document embeddings
-        document_embeddings = bot.transform_document(ocr_text, instance.session_activity)
-        instance.document_embeddings = document_embeddings
+class SessionPageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SessionPage
+        fields = ['page_number', 'image_url', 'ocr_text', 'status', 'error', 'updated_at']
+        read_only_fields = fields
 
-        # Extract and assign session keywords
-        session_keywords = bot.extract_keywords(ocr_text)
-        instance.session_keywords = session_keywords
 
-        instance.save()
-        return instance
+class ChatTurnSerializer(serializers.Serializer):
+    user_query = serializers.CharField()
+    use_cache = serializers.BooleanField(default=True)
 
 
 class ChatSessionsSerializer(serializers.ModelSerializer):
+    chat_history = serializers.SerializerMethodField()
+
     class Meta:
         model = ChatSessions
         fields = ['id', 'session', 'chat_history']
         read_only_fields = ['id', 'session', 'chat_history']
 
-    def update(self, instance, validated_data):
-        request = self.context['request']
-        user_query = request.data.get('user_query')
-        session_id = request.data.get('session_id')
-
-        if not user_query:
-            raise serializers.ValidationError({"user_query": "This field is required."})
-        if not session_id:
-            raise serializers.ValidationError({"session_id": "This field is required."})
-
-        try:
-            session_data = UserSession.objects.get(id=session_id, user=request.user)
-        except UserSession.DoesNotExist:
-            raise serializers.ValidationError({"error": "Invalid session or not authorized."})
-
-        context_doc = session_data.ocr_text
-        if not context_doc:
-            raise serializers.ValidationError({"error": "Context document is required for chatbot interaction."})
-
-        chat_history = instance.chat_history or []
-
-        # Get response from chatbot
-        bot = AzureChatbot()
-        response = bot.rag_chatbot(user_query, context_doc, prev_chat_context=chat_history[-15:])
-
-        # Append new entry to chat history
-        chat_history.append({
-            "user_query": user_query,
-            "response": response
-        })
-
-        # Save updated history
-        instance.chat_history = chat_history
-        instance.save()
-
-        # Return both instance and response for custom use
-        return [instance, {"response": response}]
+    def get_chat_history(self, obj):
+        return list(obj.messages.order_by('sequence').values('user_query', 'response'))
@@ -0,0 +1,96 @@
+import json
+import logging
+import openai
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from services.chatbot import AzureChatbot
+from services.clients import run_blocking
+from .async_views import AsyncAPIView, upstream_exception
+from .chat import prepare_chat_turn, store_cached_answer
+from .models import ChatSessions
+from .serializers import ChatTurnSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _load_chat_turn(user, session_id, user_query, bot, use_cache):
+    # Returns (chat_session, cache_key, cached_response, context_doc, history_context)
+    chat_session = await ChatSessions.objects.select_related('session').aget(session_id=session_id, session__user=user)
+    return (chat_session, *await prepare_chat_turn(chat_session, user_query, bot, use_cache))
+
+
+class EventStreamRenderer(BaseRenderer):
+    # Lets clients send Accept: text/event-stream; responses that are not streams (errors
+    # raised before the stream starts) are rendered as a single SSE error event
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _sse(data, event="error").encode(self.charset)
+
+
+class ChatStreamView(AsyncAPIView):
+    # Served token-by-token only under ASGI (app/asgi.py); WSGI servers buffer async streams.
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    async def post(self, request, session_id):
+        serializer = ChatTurnSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_query, use_cache = serializer.validated_data['user_query'], serializer.validated_data['use_cache']
+
+        bot = AzureChatbot()
+        try:
+            chat_session, cache_key, cached_response, context_doc, history = await _load_chat_turn(
+                request.user, session_id, user_query, bot, use_cache
+            )
+        except ChatSessions.DoesNotExist:
+            return Response({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        async def event_stream():
+            if cached_response is not None:
+                message = await sync_to_async(chat_session.append_message)(user_query, cached_response)
+                yield _sse({"delta": cached_response})
+                yield _sse({"sequence": message.sequence, "response": cached_response, "cached": True}, event="done")
+                return
+
+            parts = []
+            try:
+                async for token in bot.arag_chatbot_stream(user_query, context_doc, prev_chat_context=history):
+                    parts.append(token)
+                    yield _sse({"delta": token})
+            except openai.APIError as e:
+                # Headers are already sent, so the status can only be reported in-stream
+                error = upstream_exception(e)
+                yield _sse({"error": str(error.detail), "status": error.status_code}, event="error")
+                return
+            except Exception:
+                # Internal errors are logged, not relayed; this is the 500 a JSON turn would get
+                logger.exception("Chat stream for session %s failed", session_id)
+                yield _sse({"error": "Internal server error.", "status": status.HTTP_500_INTERNAL_SERVER_ERROR}, event="error")
+                return
+
+            # Persist once, after the full completion has been relayed
+            response = "".join(parts)
+            if use_cache:
+                await run_blocking(store_cached_answer, cache_key, response)
+            message = await sync_to_async(chat_session.append_message)(user_query, response)
+            yield _sse({"sequence": message.sequence, "response": response, "cached": False}, event="done")
+
+        streaming_response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+        streaming_response["Cache-Control"] = "no-cache"
+        streaming_response["X-Accel-Buffering"] = "no"
+        return streaming_response
@@ -0,0 +1,71 @@
+from unittest import mock
+from django.test import TestCase
+from services.cache import CompletionCache
+from services.metrics import completion_cache_lookups
+from services.standins import Latency, StandInChatbot, configure_standins
+from .models import CachedCompletion
+
+
+class CompletionCacheTests(TestCase):
+    def setUp(self):
+        self.cache = CompletionCache('ocr', max_local_bytes=1024, max_db_bytes=1024)
+
+    def test_database_tier_backs_the_local_tier(self):
+        key = self.cache.make_key("1", "model", "prompt", b"page bytes")
+        self.cache.set(key, "Eigenvalues.")
+        self.cache.local.clear()
+
+        self.assertEqual(self.cache.get(key), "Eigenvalues.")
+        self.assertEqual(self.cache.counters['db_hits'], 1)
+        # Promoted back into the local tier
+        self.assertEqual(self.cache.get(key), "Eigenvalues.")
+        self.assertEqual(self.cache.counters['db_hits'], 1)
+
+    def test_database_tier_is_trimmed_least_recently_used_first(self):
+        keys = [self.cache.make_key(i) for i in range(3)]
+        for key in keys:
+            self.cache.set(key, "x" * 400)
+        # Reads from the database tier mark an entry as used
+        self.cache.local.clear()
+        self.cache.get(keys[0])
+
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertEqual(sorted(CachedCompletion.objects.values_list('key', flat=True)), sorted([keys[0], keys[2]]))
+
+    def test_lookups_are_exported_by_tier(self):
+        def lookups():
+            return [completion_cache_lookups.value(kind='ocr', result=result) for result in ('local_hits', 'db_hits', 'misses')]
+
+        before = lookups()
+        key = self.cache.make_key("1", b"page bytes")
+        self.cache.get(key)
+        self.cache.set(key, "Eigenvalues.")
+        self.cache.get(key)
+        self.cache.local.clear()
+        self.cache.get(key)
+
+        self.assertEqual([after - start for after, start in zip(lookups(), before)], [1, 1, 1])
+        self.assertEqual(self.cache.counters, {'local_hits': 1, 'db_hits': 1, 'misses': 1})
+
+    def test_keys_address_content(self):
+        self.assertEqual(self.cache.make_key("1", b"page"), self.cache.make_key("1", b"page"))
+        self.assertNotEqual(self.cache.make_key("1", b"page"), self.cache.make_key("2", b"page"))
+        self.assertNotEqual(self.cache.make_key("1", b"page"), self.cache.make_key("1", b"other page"))
+
+
+class OCRCacheTests(TestCase):
+    def setUp(self):
+        configure_standins(Latency(), Latency(), Latency(), Latency())
+        patcher = mock.patch('services.chatbot.ocr_cache', CompletionCache('ocr', 1024 * 1024, 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bot = StandInChatbot()
+
+    def test_identical_pages_are_ocrd_once(self):
+        with mock.patch.object(StandInChatbot.completions, 'create', wraps=StandInChatbot.completions.create) as create:
+            first = self.bot.image_to_text(image_bytes=b"\xff\xd8 page one")
+            again = self.bot.image_to_text(image_bytes=b"\xff\xd8 page one")
+            self.bot.image_to_text(image_bytes=b"\xff\xd8 page two")
+
+        self.assertEqual(first, again)
+        self.assertEqual(create.call_count, 2)
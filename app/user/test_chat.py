@@ -0,0 +1,249 @@
+import asyncio
+import json
+from unittest import mock
+import httpx
+import openai
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from config.config import chat_history_window
+from services.cache import AnswerCache
+from services.retrieval import HashingEmbedder, build_index
+from .async_views import ChatSessionsView
+from .chat import build_history_context
+from .models import UserSession, ChatSessions
+from .streaming import ChatStreamView
+
+
+async def fake_summary(previous_summary, turns, max_tokens=None):
+    # Keeps every folded question so the test can see what reached the summary
+    return " ".join(filter(None, [previous_summary] + [turn['user_query'] for turn in turns]))
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='student', password='password123')
+        session = UserSession.objects.create(user=user, session_name="Linear algebra", ocr_text="Eigenvalues.")
+        self.chat_session = ChatSessions.objects.create(session=session)
+        self.bot = mock.Mock()
+        self.bot.asummarize_conversation = mock.AsyncMock(side_effect=fake_summary)
+
+    def add_turns(self, count):
+        for i in range(self.chat_session.message_count + 1, self.chat_session.message_count + count + 1):
+            self.chat_session.append_message(f"q{i:03d}", f"a{i:03d}")
+
+    def test_short_history_is_not_summarized(self):
+        self.add_turns(3)
+        context = async_to_sync(build_history_context)(self.chat_session, self.bot)
+        self.bot.asummarize_conversation.assert_not_called()
+        self.assertIn("q001", context)
+
+    def test_turns_sliding_out_of_the_window_are_summarized(self):
+        # Short turns never overflow the token budget; only the window overflows
+        self.add_turns(chat_history_window + 2)
+        context = async_to_sync(build_history_context)(self.chat_session, self.bot)
+
+        self.chat_session.refresh_from_db()
+        self.assertIn("q001", self.chat_session.history_summary)
+        self.assertIn("q001", context)
+        self.assertIn(f"q{chat_history_window + 2:03d}", context)
+
+        # Every turn is either in the summary or among the recent turns, never neither
+        for i in range(1, chat_history_window + 3):
+            query = f"q{i:03d}"
+            in_summary = query in self.chat_session.history_summary
+            self.assertTrue(in_summary or f"User: {query}" in context, query)
+
+    def test_folding_continues_across_turns(self):
+        self.add_turns(chat_history_window + 2)
+        async_to_sync(build_history_context)(self.chat_session, self.bot)
+        self.add_turns(chat_history_window)
+        async_to_sync(build_history_context)(self.chat_session, self.bot)
+
+        self.chat_session.refresh_from_db()
+        summarized = self.chat_session.history_summary.split()
+        self.assertEqual(summarized, [f"q{i:03d}" for i in range(1, self.chat_session.summary_through + 1)])
+
+
+def upstream_error(error_class, status_code):
+    response = httpx.Response(status_code, request=httpx.Request("POST", "https://azure.invalid"))
+    return error_class("upstream failed", response=response, body=None)
+
+
+def read_events(response):
+    async def collect():
+        return b"".join([chunk async for chunk in response.streaming_content]).decode()
+    events = []
+    for block in async_to_sync(collect)().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+
+@mock.patch('user.chat.get_embedder', return_value=HashingEmbedder())
+class ChatEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        text = "Eigenvalues are the scalars lambda for which Av = lambda v."
+        self.session = UserSession.objects.create(user=self.user, session_name="Linear algebra", ocr_text=text,
+                                                  document_embeddings=build_index(text, HashingEmbedder()))
+        ChatSessions.objects.create(session=self.session)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/user_sessions/{self.session.id}/chat-sessions/'
+
+    def test_views_run_on_the_event_loop(self, _):
+        # Under ASGI Django awaits the view directly instead of running it in a thread
+        for view in (ChatSessionsView, ChatStreamView):
+            self.assertTrue(asyncio.iscoroutinefunction(view.as_view()))
+
+    def test_requires_authentication(self, _):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+        self.assertEqual(APIClient().post(f'{self.url}stream/', {'user_query': 'q'}, format='json').status_code, 401)
+
+    def test_invalid_turn_is_rejected(self, _):
+        response = self.client.put(self.url, {'use_cache': False}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user_query', response.json())
+
+    @mock.patch('user.async_views.AzureChatbot')
+    def test_upstream_errors_map_to_gateway_statuses(self, bot_class, _):
+        for error, status_code in [
+            (upstream_error(openai.RateLimitError, 429), 503),
+            (upstream_error(openai.InternalServerError, 500), 503),
+            (upstream_error(openai.BadRequestError, 400), 502),
+        ]:
+            bot_class.return_value.arag_chatbot = mock.AsyncMock(side_effect=error)
+            response = self.client.put(self.url, {'user_query': 'What are eigenvalues?', 'use_cache': False}, format='json')
+            self.assertEqual(response.status_code, status_code, type(error).__name__)
+
+    @mock.patch('user.streaming.AzureChatbot')
+    def test_stream_relays_tokens_then_saves_the_turn(self, bot_class, _):
+        async def tokens(*args, **kwargs):
+            for token in ["Eigen", "values ", "are scalars."]:
+                yield token
+        bot_class.return_value.arag_chatbot_stream = tokens
+
+        response = self.client.post(f'{self.url}stream/', {'user_query': 'What are eigenvalues?', 'use_cache': False}, format='json')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = read_events(response)
+
+        self.assertEqual([data['delta'] for event, data in events[:-1]], ["Eigen", "values ", "are scalars."])
+        self.assertEqual(events[-1], ('done', {'sequence': 1, 'response': "Eigenvalues are scalars.", 'cached': False}))
+        self.assertEqual(self.session.chat_session.messages.get().response, "Eigenvalues are scalars.")
+
+    @mock.patch('user.streaming.AzureChatbot')
+    def test_stream_reports_upstream_errors_as_events(self, bot_class, _):
+        async def tokens(*args, **kwargs):
+            yield "Eigen"
+            raise upstream_error(openai.RateLimitError, 429)
+        bot_class.return_value.arag_chatbot_stream = tokens
+
+        response = self.client.post(f'{self.url}stream/', {'user_query': 'What are eigenvalues?', 'use_cache': False}, format='json')
+        event, data = read_events(response)[-1]
+        self.assertEqual(event, 'error')
+        self.assertEqual(data['status'], 503)
+        self.assertFalse(self.session.chat_session.messages.exists())
+
+    @mock.patch('user.streaming.AzureChatbot')
+    def test_stream_hides_internal_errors(self, bot_class, _):
+        async def tokens(*args, **kwargs):
+            yield "Eigen"
+            raise RuntimeError("connection to db.internal:5432 refused")
+        bot_class.return_value.arag_chatbot_stream = tokens
+
+        response = self.client.post(f'{self.url}stream/', {'user_query': 'What are eigenvalues?', 'use_cache': False}, format='json')
+        with self.assertLogs('user.streaming', 'ERROR') as logs:
+            event, data = read_events(response)[-1]
+        self.assertEqual((event, data), ('error', {'error': "Internal server error.", 'status': 500}))
+        self.assertIn("db.internal", logs.output[0])
+
+
+@mock.patch('user.chat.get_embedder', return_value=HashingEmbedder())
+@mock.patch('user.async_views.AzureChatbot')
+class AnswerCacheTests(TestCase):
+    text = "Eigenvalues are the scalars lambda for which Av = lambda v."
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.use_cache(AnswerCache(1024 * 1024, ttl=60))
+
+    def use_cache(self, cache):
+        patcher = mock.patch('user.chat.answer_cache', cache)
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_chat(self):
+        # Every session built from the same document shares its cached first turns
+        session = UserSession.objects.create(user=self.user, session_name="Linear algebra", ocr_text=self.text,
+                                             document_embeddings=build_index(self.text, HashingEmbedder()))
+        ChatSessions.objects.create(session=session)
+        return f'/api/user_sessions/{session.id}/chat-sessions/'
+
+    def ask(self, url, user_query="What are eigenvalues?", use_cache=True):
+        return self.client.put(url, {'user_query': user_query, 'use_cache': use_cache}, format='json').json()
+
+    def answering(self, bot_class):
+        bot_class.return_value.arag_chatbot = mock.AsyncMock(return_value="Scalars.")
+        return bot_class.return_value.arag_chatbot
+
+    def test_first_turns_are_answered_from_the_cache(self, bot_class, _):
+        model = self.answering(bot_class)
+        self.assertFalse(self.ask(self.new_chat())['cached'])
+        reply = self.ask(self.new_chat(), "what are  eigenvalues")
+
+        self.assertEqual((reply['response'], reply['cached']), ("Scalars.", True))
+        self.assertEqual(model.await_count, 1)
+        self.assertEqual(self.cache.counters['exact_hits'], 1)
+
+    @mock.patch('user.streaming.AzureChatbot')
+    def test_streamed_turns_share_the_cache(self, stream_bot_class, bot_class, _):
+        self.answering(bot_class)
+        self.ask(self.new_chat())
+        response = self.client.post(f'{self.new_chat()}stream/', {'user_query': 'What are eigenvalues?'}, format='json')
+
+        self.assertEqual(read_events(response)[-1], ('done', {'sequence': 1, 'response': "Scalars.", 'cached': True}))
+        stream_bot_class.return_value.arag_chatbot_stream.assert_not_called()
+
+    @mock.patch('services.cache.time')
+    def test_answers_expire_after_the_ttl(self, clock, bot_class, _):
+        model = self.answering(bot_class)
+        clock.monotonic.return_value = 0.0
+        self.ask(self.new_chat())
+        clock.monotonic.return_value = 61.0
+
+        self.assertFalse(self.ask(self.new_chat())['cached'])
+        self.assertEqual(model.await_count, 2)
+
+    def test_use_cache_false_neither_reads_nor_writes(self, bot_class, _):
+        model = self.answering(bot_class)
+        self.ask(self.new_chat(), use_cache=False)
+        self.assertEqual(len(self.cache.exact), 0)
+
+        self.ask(self.new_chat())
+        self.assertFalse(self.ask(self.new_chat(), use_cache=False)['cached'])
+        self.assertEqual(model.await_count, 3)
+
+    def test_follow_ups_bypass_the_cache(self, bot_class, _):
+        model = self.answering(bot_class)
+        url = self.new_chat()
+        self.ask(url)
+        # The same question again is a follow-up now and depends on the first turn
+        self.assertFalse(self.ask(url)['cached'])
+
+        self.assertEqual(model.await_count, 2)
+        self.assertEqual(len(self.cache.exact), 1)
+        self.assertEqual(sum(self.cache.counters.values()), 1)
+
+    def test_near_duplicate_questions_reuse_an_answer(self, bot_class, _):
+        self.use_cache(AnswerCache(1024 * 1024, ttl=60, near_duplicates=True, similarity=0.8))
+        model = self.answering(bot_class)
+        self.ask(self.new_chat(), "What are the eigenvalues of a matrix?")
+
+        self.assertTrue(self.ask(self.new_chat(), "What are eigenvalues of a matrix?")['cached'])
+        self.assertFalse(self.ask(self.new_chat(), "How does a series converge?")['cached'])
+        self.assertEqual(model.await_count, 2)
+        self.assertEqual((self.cache.counters['near_hits'], self.cache.counters['misses']), (1, 2))
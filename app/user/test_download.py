@@ -0,0 +1,104 @@
+import os
+import tempfile
+from unittest import mock
+import httpx
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from services.filetranslator import FileTranslator, PDFDownloadError, PDFWriter
+
+PDF_URL = "https://appwrite.invalid/files/lecture.pdf"
+PDF = b"%PDF-1.4\n" + b"0" * 1000
+
+
+def pdf_server(body=PDF, content_type="application/pdf", status=200, content_length=True):
+    # Without content_length the body is streamed in chunks and no Content-Length is sent
+    async def chunks():
+        for i in range(0, len(body), 100):
+            yield body[i:i + 100]
+
+    def handler(request):
+        headers = {"Content-Type": content_type}
+        if content_length:
+            return httpx.Response(status, headers=headers, content=body)
+        return httpx.Response(status, headers=headers, content=chunks())
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def offline(client):
+    # Downloads go to client, and the Appwrite client FileTranslator would configure from
+    # the environment is never built, so no credentials are needed
+    return mock.patch.multiple(
+        'services.filetranslator', get_appwrite_client=mock.DEFAULT, get_async_http_client=mock.Mock(return_value=client),
+    )
+
+
+@mock.patch('services.filetranslator.pdf_max_bytes', 2000)
+class DownloadLimitTests(SimpleTestCase):
+    def download(self, client):
+        with offline(client), tempfile.TemporaryFile() as file:
+            async_to_sync(FileTranslator().adownload_pdf)(PDF_URL, file)
+            file.seek(0)
+            return file.read()
+
+    def test_pdf_is_written_to_the_file(self):
+        self.assertEqual(self.download(pdf_server()), PDF)
+        self.assertEqual(self.download(pdf_server(content_type="application/pdf; charset=binary", content_length=False)), PDF)
+
+    def test_error_responses_are_rejected(self):
+        with self.assertRaisesMessage(PDFDownloadError, "HTTP 404"):
+            self.download(pdf_server(status=404))
+
+    def test_other_content_types_are_rejected(self):
+        with self.assertRaisesMessage(PDFDownloadError, "expected PDF"):
+            self.download(pdf_server(b"<html></html>", content_type="text/html"))
+
+    def test_oversized_content_length_is_rejected_before_the_body(self):
+        with self.assertRaisesMessage(PDFDownloadError, "2000 byte limit"), \
+                mock.patch.object(PDFWriter, 'write') as write:
+            self.download(pdf_server(PDF * 3))
+        write.assert_not_called()
+
+    def test_bodies_without_content_length_are_capped(self):
+        with self.assertRaisesMessage(PDFDownloadError, "2000 byte limit"):
+            self.download(pdf_server(PDF * 3, content_length=False))
+
+    def test_files_without_a_pdf_signature_are_rejected(self):
+        with self.assertRaisesMessage(PDFDownloadError, "not a PDF"):
+            self.download(pdf_server(b"<html></html>"))
+
+    # A deadline already in the past stands in for a server that trickles the body
+    @mock.patch('services.filetranslator.pdf_download_timeout', -1)
+    def test_slow_downloads_hit_the_deadline(self):
+        with self.assertRaisesMessage(PDFDownloadError, "took longer than"):
+            self.download(pdf_server())
+
+
+class DownloadTempFileTests(SimpleTestCase):
+    def open_download(self, client):
+        async def download():
+            async with FileTranslator().adownloaded_pdf(PDF_URL) as pdf_path:
+                # Rendering reopens the PDF by name, so it must be complete and closed by now
+                with open(pdf_path, "rb") as pdf:
+                    self.paths.append(pdf_path)
+                    return pdf.read()
+
+        self.paths = []
+        with offline(client):
+            return async_to_sync(download)()
+
+    def test_downloaded_pdf_is_removed_on_exit(self):
+        self.assertEqual(self.open_download(pdf_server()), PDF)
+        self.assertFalse(os.path.exists(os.path.dirname(self.paths[0])))
+
+    @mock.patch('services.filetranslator.pdf_max_bytes', 2000)
+    def test_failed_downloads_leave_nothing_behind(self):
+        tmp_dirs, temporary_directory = [], tempfile.TemporaryDirectory
+
+        def track():
+            tmp_dirs.append(temporary_directory())
+            return tmp_dirs[-1]
+
+        with mock.patch.object(tempfile, 'TemporaryDirectory', side_effect=track), \
+                self.assertRaises(PDFDownloadError):
+            self.open_download(pdf_server(PDF * 3, content_length=False))
+        self.assertFalse(os.path.exists(tmp_dirs[0].name))
@@ -0,0 +1,199 @@
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from services.chatbot import AzureChatbot, PageOCRError
+from services.filetranslator import FileTranslator, page_batches
+from services.imaging import encode_page
+from services.pipeline import arender_upload_and_ocr
+from services.standins import Latency, StandInChatbot, StandInError, StandInFileTranslator, configure_standins, make_pdf
+from .benchmark import standin_patches
+from .jobs import claim_next_job, requeue_stale_jobs, retry_session_job, run_job
+from .models import SessionJob, SessionPage
+
+SMALL_PAGE = (240, 340)
+PDF_URL = "https://standin.invalid/3-pages.pdf"
+
+
+def use_standins(test, upload_error_rate=0.0):
+    # Offline Azure/Appwrite with synthetic pages, as in the benchmark, and caches off
+    configure_standins(Latency(), Latency(), Latency(error_rate=upload_error_rate), Latency(), render_pages=False)
+    patches = standin_patches()
+    patches.enter_context(mock.patch.object(StandInFileTranslator, 'page_size', SMALL_PAGE))
+    test.addCleanup(patches.close)
+    StandInFileTranslator.pdfs[PDF_URL] = make_pdf(3, *SMALL_PAGE)
+
+
+def spy_ocr():
+    return mock.patch.object(StandInChatbot, 'aimage_to_text', autospec=True, side_effect=AzureChatbot.aimage_to_text)
+
+
+class PageStageTests(SimpleTestCase):
+    def test_rendered_bytes_go_straight_to_ocr(self):
+        use_standins(self)
+        with spy_ocr() as ocr, mock.patch('services.chatbot.get_http_session') as http_session:
+            image_urls, ocr_texts = async_to_sync(arender_upload_and_ocr)(PDF_URL, StandInFileTranslator(), StandInChatbot())
+
+        self.assertEqual(len(image_urls), 3)
+        self.assertEqual(len(ocr_texts), 3)
+        # OCR is sent the rendered JPEGs, never a re-download of the uploaded pages
+        self.assertEqual(ocr.call_count, 3)
+        for call in ocr.call_args_list:
+            self.assertTrue(call.args[1].startswith(b"\xff\xd8"))
+        http_session.assert_not_called()
+
+    def test_failed_uploads_do_not_hold_up_ocr(self):
+        use_standins(self, upload_error_rate=1.0)
+        with spy_ocr() as ocr, self.assertRaises(PageOCRError) as failure:
+            async_to_sync(arender_upload_and_ocr)(PDF_URL, StandInFileTranslator(), StandInChatbot())
+
+        self.assertEqual(ocr.call_count, 3)
+        self.assertEqual(sorted(failure.exception.failures), [1, 2, 3])
+        self.assertTrue(all(error.startswith("upload:") for error in failure.exception.failures.values()))
+
+    def test_lost_checkpoints_fail_only_their_page(self):
+        use_standins(self)
+        checkpointed = []
+
+        def on_page(page_number, result):
+            if page_number == 2:
+                raise RuntimeError("database table is locked")
+            checkpointed.append(page_number)
+
+        with self.assertRaises(PageOCRError) as failure, self.assertLogs('services.pipeline', 'ERROR'):
+            async_to_sync(arender_upload_and_ocr)(PDF_URL, StandInFileTranslator(), StandInChatbot(), on_page=on_page)
+
+        self.assertEqual(failure.exception.failures, {2: "checkpoint: database table is locked"})
+        self.assertEqual(sorted(checkpointed), [1, 3])
+
+
+class PageResumeTests(TransactionTestCase):
+    def setUp(self):
+        use_standins(self)
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.failing_pages = set()
+        self.ocr_pages = []
+        self.page_bytes = {encode_page(StandInFileTranslator.page_image(number)): number for number in (1, 2, 3)}
+
+    async def flaky_ocr(self, bot, image_bytes):
+        page_number = self.page_bytes[image_bytes]
+        self.ocr_pages.append(page_number)
+        if page_number in self.failing_pages:
+            raise StandInError("injected ocr failure")
+        return f"text of page {page_number}"
+
+    def test_retry_only_redoes_the_failed_page(self):
+        SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL)
+        self.failing_pages.add(2)
+        with mock.patch.object(StandInChatbot, 'aimage_to_text', autospec=True, side_effect=self.flaky_ocr), \
+                mock.patch.object(StandInFileTranslator, 'aupload_bytes', autospec=True, side_effect=FileTranslator.aupload_bytes) as upload:
+            job = run_job(claim_next_job())
+            job.refresh_from_db()
+            self.assertEqual(job.status, SessionJob.Status.FAILED)
+            self.assertEqual(list(job.error['failed_pages']), ['2'])
+            statuses = dict(SessionPage.objects.filter(job=job).values_list('page_number', 'status'))
+            self.assertEqual(statuses, {1: 'done', 2: 'failed', 3: 'done'})
+
+            self.failing_pages.clear()
+            self.ocr_pages.clear()
+            upload.reset_mock()
+            self.assertTrue(retry_session_job(job))
+            job = run_job(claim_next_job())
+
+        self.assertEqual(job.status, SessionJob.Status.SUCCEEDED)
+        # Page 2 rendered to the same bytes, so only its OCR is redone and its upload reused
+        self.assertEqual(self.ocr_pages, [2])
+        upload.assert_not_called()
+        self.assertEqual(job.session.ocr_text, "text of page 1\ntext of page 2\ntext of page 3")
+        self.assertEqual(job.session.pages.count(), 3)
+
+    def test_only_failed_or_stalled_jobs_are_retried(self):
+        job = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.RUNNING)
+        self.assertFalse(retry_session_job(job))
+        SessionJob.objects.filter(id=job.id).update(status=SessionJob.Status.SUCCEEDED)
+        self.assertFalse(retry_session_job(job))
+
+
+class PageBatchTests(SimpleTestCase):
+    def test_batches_skip_finished_pages(self):
+        self.assertEqual(page_batches(7, 3, skip_pages={3, 4}), [(1, 2), (5, 7)])
+        self.assertEqual(page_batches(5, 2), [(1, 2), (3, 4), (5, 5)])
+        self.assertEqual(page_batches(2, 4, skip_pages={1, 2}), [])
+
+
+@mock.patch('user.jobs.session_jobs_in_process', False)
+class SessionJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_creating_a_session_enqueues_a_job(self):
+        response = self.client.post('/api/user-sessions/', {'pdf_public_url': PDF_URL, 'specifications': {"style": "summary"}}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job = SessionJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual((job.user, job.status, job.specifications), (self.user, SessionJob.Status.PENDING, {"style": "summary"}))
+        self.assertTrue(response.json()['status_url'].endswith(f'/api/user-sessions/jobs/{job.id}/'))
+        self.assertEqual(self.client.post('/api/user-sessions/', {}, format='json').status_code, 400)
+
+    def test_in_process_jobs_start_once_the_job_is_committed(self):
+        with mock.patch('user.jobs.session_jobs_in_process', True), mock.patch('user.jobs._get_executor') as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/user-sessions/', {'pdf_public_url': PDF_URL}, format='json')
+            executor.assert_not_called()
+        executor.return_value.submit.assert_called_once()
+
+    def test_job_status_is_only_visible_to_its_owner(self):
+        job = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.RUNNING,
+                                        stage='ocr', progress_current=1, progress_total=4)
+        response = self.client.get(f'/api/user-sessions/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({key: response.json()[key] for key in ('status', 'stage', 'progress')},
+                         {'status': 'running', 'stage': 'ocr', 'progress': 25})
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='password123'))
+        self.assertEqual(other.get(f'/api/user-sessions/jobs/{job.id}/').status_code, 404)
+
+    def test_jobs_are_claimed_oldest_first_and_only_once(self):
+        older = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, created_at=timezone.now() - timedelta(minutes=1))
+        newer = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL)
+        SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.FAILED)
+
+        claimed = claim_next_job()
+        self.assertEqual((claimed.id, claimed.status, claimed.stage), (older.id, SessionJob.Status.RUNNING, 'starting'))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(claim_next_job().id, newer.id)
+        self.assertIsNone(claim_next_job())
+
+    def test_workers_skip_rows_locked_by_other_claims(self):
+        SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL)
+        # SQLite has no row locks; on backends that do, the claim must not wait on them
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as select_for_update, \
+                mock.patch('user.jobs.connection.features.has_select_for_update_skip_locked', True):
+            self.assertIsNotNone(claim_next_job())
+        self.assertEqual(select_for_update.call_args.kwargs, {'skip_locked': True})
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.RUNNING)
+        fresh = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.RUNNING)
+        SessionJob.objects.filter(id=stale.id).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with mock.patch('user.jobs.session_job_stale_seconds', 600):
+            self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(SessionJob.objects.get(id=stale.id).status, SessionJob.Status.PENDING)
+        self.assertEqual(SessionJob.objects.get(id=fresh.id).status, SessionJob.Status.RUNNING)
+
+    def test_retry_endpoint_requeues_failed_jobs_only(self):
+        job = SessionJob.objects.create(user=self.user, pdf_public_url=PDF_URL, status=SessionJob.Status.RUNNING)
+        self.assertEqual(self.client.post(f'/api/user-sessions/jobs/{job.id}/retry/').status_code, 409)
+
+        SessionJob.objects.filter(id=job.id).update(status=SessionJob.Status.FAILED, error={"error": "OCR failed"})
+        response = self.client.post(f'/api/user-sessions/jobs/{job.id}/retry/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.json()['job']['status'], response.json()['job']['error']), ('pending', None))
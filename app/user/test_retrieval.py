@@ -0,0 +1,47 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from services.prompting import CHUNK_SEPARATOR, count_tokens, fit_chunks
+from services.retrieval import HashingEmbedder, build_index, chunk_text, is_current_index, rank_chunks
+
+TOPICS = [
+    "Eigenvalues are the scalars lambda for which Av equals lambda v for a non-zero vector v.",
+    "The derivative of a function measures how its output changes as its input changes.",
+    "A series converges when the sequence of its partial sums approaches a finite limit.",
+    "Variance is the expected squared deviation of a random variable from its mean.",
+]
+
+
+class RetrievalTests(SimpleTestCase):
+    def setUp(self):
+        self.embedder = HashingEmbedder()
+        self.index = build_index("\n\n".join(TOPICS), self.embedder)
+
+    def test_chunks_keep_paragraphs_whole(self):
+        chunks = chunk_text("\n\n".join(TOPICS), max_words=40, overlap=0)
+        self.assertEqual(chunks, [f"{TOPICS[0]} {TOPICS[1]}", f"{TOPICS[2]} {TOPICS[3]}"])
+
+    def test_long_paragraphs_are_split_with_overlap(self):
+        words = [f"w{i}" for i in range(25)]
+        chunks = chunk_text(" ".join(words), max_words=10, overlap=2)
+        self.assertEqual(chunks[0].split(), words[:10])
+        self.assertEqual(chunks[1].split()[:2], words[8:10])
+        self.assertEqual(chunks[-1].split()[-1], "w24")
+
+    def test_matching_chunk_ranks_first(self):
+        with mock.patch('services.retrieval.retrieval_chunk_words', 20), mock.patch('services.retrieval.retrieval_chunk_overlap', 0):
+            index = build_index("\n\n".join(TOPICS), self.embedder)
+        self.assertEqual(index["chunks"], TOPICS)
+
+        ranked = rank_chunks(index, "When does a series converge to a limit?", k=2, embedder=self.embedder)
+        self.assertEqual(len(ranked), 2)
+        self.assertEqual(ranked[0], (2, TOPICS[2]))
+
+    def test_index_is_tied_to_its_embedder(self):
+        self.assertTrue(is_current_index(self.index, self.embedder))
+        self.assertFalse(is_current_index(self.index | {"embedder": "azure:other"}, self.embedder))
+        self.assertFalse(is_current_index("legacy embeddings", self.embedder))
+
+    def test_best_chunks_that_fit_are_kept_in_document_order(self):
+        ranked = [(2, TOPICS[2]), (0, TOPICS[0]), (3, TOPICS[3])]
+        budget = count_tokens(TOPICS[2]) + count_tokens(TOPICS[0]) + 2 * count_tokens(CHUNK_SEPARATOR)
+        self.assertEqual(fit_chunks(ranked, budget), CHUNK_SEPARATOR.join([TOPICS[0], TOPICS[2]]))
@@ -0,0 +1,101 @@
+import base64
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+import openai
+from django.test import SimpleTestCase
+from PIL import Image
+from services import scheduler
+from services.imaging import vision_tokens
+from services.retrieval import AzureEmbedder
+from services.scheduler import BULK, INTERACTIVE, QuotaScheduler, estimate_tokens, run_with_quota
+
+
+def rate_limited(retry_after_ms=None):
+    headers = {"retry-after-ms": str(retry_after_ms)} if retry_after_ms else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://azure.invalid"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+# 6000 tokens per minute is 100 per second; with a one second burst the bucket holds 100
+# tokens, 50 of which only interactive calls may spend
+@mock.patch.multiple(
+    'services.scheduler', azure_tpm_limit=6000, azure_rpm_limit=0,
+    azure_rate_limit_burst_seconds=1.0, azure_rate_limit_interactive_reserve=0.5,
+)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.state = scheduler._new_state()
+
+    def test_calls_wait_for_the_bucket_to_refill(self):
+        self.assertEqual(scheduler._take(self.state, 30, INTERACTIVE, now=0.0), 0.0)
+        self.assertEqual(scheduler._take(self.state, 60, INTERACTIVE, now=0.0), 0.0)
+        self.assertAlmostEqual(scheduler._take(self.state, 30, INTERACTIVE, now=0.0), 0.2)
+        self.assertEqual(scheduler._take(self.state, 30, INTERACTIVE, now=0.2), 0.0)
+
+    def test_bulk_calls_leave_the_interactive_reserve(self):
+        self.assertEqual(scheduler._take(self.state, 40, BULK, now=0.0), 0.0)
+        self.assertAlmostEqual(scheduler._take(self.state, 40, BULK, now=0.0), 0.3)
+        self.assertEqual(scheduler._take(self.state, 40, INTERACTIVE, now=0.0), 0.0)
+
+    def test_oversized_calls_are_admitted_once_the_bucket_is_full(self):
+        self.assertEqual(scheduler._take(self.state, 500, INTERACTIVE, now=0.0), 0.0)
+        self.assertAlmostEqual(scheduler._take(self.state, 10, INTERACTIVE, now=0.0), 4.1)
+
+    def test_rate_limits_drain_the_bucket(self):
+        scheduler._penalize(self.state, 2.0, now=0.0)
+        self.assertAlmostEqual(scheduler._take(self.state, 10, INTERACTIVE, now=0.0), 2.1)
+
+
+@mock.patch('services.scheduler.time.sleep')
+class RetryTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('services.scheduler.scheduler', QuotaScheduler(backend="off"))
+        self.quota = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_limited_calls_are_retried_after_retry_after(self, sleep):
+        create = mock.Mock(side_effect=[rate_limited(retry_after_ms=1500), "completion"])
+        with mock.patch.object(self.quota, 'penalize') as penalize:
+            self.assertEqual(run_with_quota("gpt", "chat", 100, create), "completion")
+        delay = sleep.call_args.args[0]
+        self.assertGreaterEqual(delay, 1.5)
+        penalize.assert_called_once_with("gpt", delay)
+
+    def test_errors_that_are_not_transient_are_raised(self, sleep):
+        response = httpx.Response(400, request=httpx.Request("POST", "https://azure.invalid"))
+        create = mock.Mock(side_effect=openai.BadRequestError("bad request", response=response, body=None))
+        with self.assertRaises(openai.BadRequestError):
+            run_with_quota("gpt", "chat", 100, create)
+        self.assertEqual(create.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_embeddings_go_through_the_same_path(self, sleep):
+        batch = SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0])], usage=SimpleNamespace(prompt_tokens=3, total_tokens=3))
+        client = SimpleNamespace(embeddings=SimpleNamespace(create=mock.Mock(side_effect=[rate_limited(), batch])))
+        with mock.patch.object(self.quota, 'acquire') as acquire:
+            vectors = AzureEmbedder(client=client, deployment="embeddings").embed(["eigenvalues"], call="embed_query")
+        self.assertEqual(vectors.shape, (1, 2))
+        self.assertEqual(client.embeddings.create.call_count, 2)
+        acquire.assert_called_with("embeddings", 3, INTERACTIVE)
+
+    @mock.patch('services.scheduler.azure_max_retries', 2)
+    def test_gives_up_after_the_configured_retries(self, sleep):
+        create = mock.Mock(side_effect=rate_limited())
+        with self.assertRaises(openai.RateLimitError):
+            run_with_quota("gpt", "chat", 100, create)
+        self.assertEqual(create.call_count, 3)
+
+
+class EstimateTests(SimpleTestCase):
+    def test_images_are_charged_by_their_size(self):
+        buffer = BytesIO()
+        Image.new("L", (900, 1200), 255).save(buffer, format="JPEG")
+        url = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+        request = {"messages": [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": url}}]}], "max_tokens": 100}
+        self.assertEqual(estimate_tokens(request), vision_tokens(900, 1200) + 4 + 100)
+
+    def test_unreadable_images_are_charged_the_maximum(self):
+        request = {"messages": [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "https://example.invalid/page.jpg"}}]}]}
+        self.assertEqual(estimate_tokens(request), scheduler.MAX_IMAGE_TOKENS + 4 + scheduler.DEFAULT_COMPLETION_TOKENS)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import UserSession
+from .search import search_sessions
+
+
+class SessionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_session(self, name, keywords="", text="", days_ago=0, user=None):
+        return UserSession.objects.create(
+            user=user or self.user, session_name=name, session_keywords=keywords, ocr_text=text,
+            last_activity=timezone.now() - timedelta(days=days_ago),
+        )
+
+
+class SearchTests(SessionTestCase):
+    # SQLite runs the icontains fallback; PostgreSQL the tsvector query
+    def test_every_term_must_match_one_of_the_fields(self):
+        both = self.add_session("Linear algebra", text="Eigenvalues of a matrix.")
+        self.add_session("Calculus", text="Eigenvalues appear in differential equations.")
+        self.add_session("Linear algebra", text="Eigenvalues.", user=User.objects.create_user(username='other'))
+
+        self.assertEqual([session.id for session in search_sessions(self.user, "linear EIGENVALUES")], [both.id])
+        self.assertEqual(search_sessions(self.user, "?!"), [])
+
+    def test_name_matches_rank_above_keyword_and_text_matches(self):
+        in_text = self.add_session("Week 3", text="Notes on eigenvalues and eigenvectors.")
+        in_keywords = self.add_session("Week 2", keywords="eigenvalues, determinants")
+        in_name = self.add_session("Eigenvalues", days_ago=30)
+        text_again = self.add_session("Week 1", text="More notes on eigenvalues and eigenvectors.", days_ago=1)
+
+        results = search_sessions(self.user, "eigenvalues")
+        # Equal ranks fall back to the most recent activity
+        self.assertEqual([session.id for session in results], [in_name.id, in_keywords.id, in_text.id, text_again.id])
+        self.assertEqual(results[2].headline, "Notes on <mark>eigenvalues</mark> and eigenvectors.")
+
+    def test_endpoint_returns_ranked_results_with_headlines(self):
+        self.add_session("Week 3", text="The characteristic polynomial gives the eigenvalues.")
+        self.add_session("Eigenvalues", keywords="eigenvalues")
+
+        response = self.client.get('/api/user-sessions/search/', {'q': 'eigenvalues'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['session_name'] for result in results], ["Eigenvalues", "Week 3"])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn("<mark>eigenvalues</mark>", results[1]['headline'])
+        self.assertEqual(self.client.get('/api/user-sessions/search/').status_code, 400)
+
+
+class KeywordTests(SessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.matrices = self.add_session("Matrices", keywords="Eigenvalues, Determinants")
+        self.spectra = self.add_session("Spectra", keywords="- eigenvalues\n- spectral theorem", days_ago=1)
+        self.limits = self.add_session("Limits", keywords="limits, continuity", days_ago=2)
+
+    def filtered(self, **params):
+        response = self.client.get('/api/user-sessions/', params)
+        self.assertEqual(response.status_code, 200)
+        return [session['session_name'] for session in response.json()['results']]
+
+    def test_any_matches_sessions_with_one_of_the_keywords(self):
+        self.assertEqual(self.filtered(keywords="eigenvalues, limits"), ["Matrices", "Spectra", "Limits"])
+        self.assertEqual(self.filtered(keywords="Spectral Theorem", match="any"), ["Spectra"])
+
+    def test_all_matches_sessions_with_every_keyword(self):
+        self.assertEqual(self.filtered(keywords="eigenvalues, determinants", match="all"), ["Matrices"])
+        self.assertEqual(self.filtered(keywords="eigenvalues, limits", match="all"), [])
+
+    def test_unknown_match_mode_is_rejected(self):
+        response = self.client.get('/api/user-sessions/', {'keywords': 'eigenvalues', 'match': 'most'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_counts_are_per_user_and_follow_edits(self):
+        self.add_session("Other", keywords="limits", user=User.objects.create_user(username='other'))
+        self.limits.session_keywords = "eigenvalues"
+        self.limits.save()
+
+        response = self.client.get('/api/user-sessions/keywords/')
+        counts = [(row['name'], row['session_count']) for row in response.json()['results']]
+        self.assertEqual(counts, [("eigenvalues", 3), ("determinants", 1), ("spectral theorem", 1)])
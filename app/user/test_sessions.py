@@ -0,0 +1,155 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from services.cache import CompletionCache, transform_cache
+from services.prompting import count_tokens, split_pages
+from services.standins import Latency, StandInChatbot, configure_standins
+from .models import UserSession, SessionPage
+
+PAGES = ["Eigenvalues and eigenvectors.", "The characteristic polynomial."]
+
+
+@mock.patch('user.serializers.AzureChatbot')
+class SessionUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.session = UserSession.objects.create(
+            user=self.user, session_name="Linear algebra", ocr_text="\n".join(PAGES),
+            session_activity={"style": "summary"}, transformed_document="Summary.", document_embeddings={"chunks": []},
+        )
+        for number, text in enumerate(PAGES, start=1):
+            SessionPage.objects.create(session=self.session, page_number=number, ocr_text=text, status=SessionPage.Status.DONE)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/user-sessions/{self.session.id}/'
+
+    def test_rename_leaves_derived_fields_alone(self, bot_class):
+        response = self.client.put(self.url, {'session_name': "Eigenvalues"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.session_name, "Eigenvalues")
+        self.assertEqual(self.session.transformed_document, "Summary.")
+        bot_class.assert_not_called()
+
+    def test_unchanged_activity_is_not_transformed_again(self, bot_class):
+        self.client.put(self.url, {'session_activity': {"style": "summary"}}, format='json')
+        bot_class.assert_not_called()
+
+    def test_new_activity_transforms_the_stored_pages(self, bot_class):
+        bot_class.return_value.transform_document.return_value = "Flashcards."
+        response = self.client.put(self.url, {'session_activity': {"style": "flashcards"}}, format='json')
+
+        self.assertEqual(response.json()['transformed_document'], "Flashcards.")
+        bot_class.return_value.transform_document.assert_called_once_with(PAGES, {"style": "flashcards"})
+        bot_class.return_value.keywords_extraction.assert_not_called()
+
+    def test_derived_fields_are_read_only(self, bot_class):
+        self.client.put(self.url, {'transformed_document': "Edited.", 'document_embeddings': {}}, format='json')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.transformed_document, "Summary.")
+        self.assertEqual(self.session.document_embeddings, {"chunks": []})
+
+
+class SessionListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+        for day in range(5):
+            self.add_session(f"Week {5 - day}", days_ago=day)
+
+    def add_session(self, name, days_ago=0):
+        return UserSession.objects.create(
+            user=self.user, session_name=name, last_activity=self.now - timedelta(days=days_ago),
+            ocr_text="Eigenvalues.", transformed_document="Summary.", document_embeddings={"chunks": []},
+        )
+
+    def test_cursor_pages_are_stable_while_sessions_are_added(self):
+        first = self.client.get('/api/user-sessions/', {'page_size': 2}).json()
+        self.assertEqual([session['session_name'] for session in first['results']], ["Week 5", "Week 4"])
+
+        # A page number would shift by one here and repeat "Week 4"
+        self.add_session("Week 6", days_ago=-1)
+        second = self.client.get(first['next']).json()
+        self.assertEqual([session['session_name'] for session in second['results']], ["Week 3", "Week 2"])
+
+    def test_list_leaves_out_the_document_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/user-sessions/')
+
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'session_name', 'session_activity', 'session_keywords', 'last_activity'})
+        session_query = next(query['sql'] for query in queries.captured_queries if 'FROM "user_usersession"' in query['sql'])
+        for column in ('ocr_text', 'transformed_document', 'document_embeddings', 'search_vector'):
+            self.assertNotIn(column, session_query)
+
+
+class TransformCacheTests(TestCase):
+    def setUp(self):
+        configure_standins(Latency(), Latency(), Latency(), Latency())
+        patcher = mock.patch('services.chatbot.transform_cache', CompletionCache('transform', 1024 * 1024, 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bot = StandInChatbot()
+
+    def test_reapplying_a_specification_costs_nothing(self):
+        with mock.patch.object(StandInChatbot.completions, 'create', wraps=StandInChatbot.completions.create) as create:
+            summary = self.bot.transform_document(PAGES, {"style": "summary"})
+            self.bot.transform_document(PAGES, {"style": "flashcards"})
+            self.assertEqual(self.bot.transform_document(PAGES, {"style": "summary"}), summary)
+        self.assertEqual(create.call_count, 2)
+
+
+def echo_completion(bot, call, **request):
+    # Transforms wrap their text in [], the reconciliation pass in <>
+    content = request["messages"][-1]["content"]
+    if call == "transform":
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"[{content.split('Document Text:', 1)[1].strip()}]"))])
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"<{content}>"))])
+
+
+class ChunkedTransformTests(SimpleTestCase):
+    def setUp(self):
+        configure_standins(Latency(), Latency(), Latency(), Latency())
+        self.pages = [f"Page {number}: " + " ".join(["eigenvalue"] * 20) for number in range(1, 7)]
+        budget = 2 * max(count_tokens(page) for page in self.pages)
+        for patcher in (
+            mock.patch.object(transform_cache, 'enabled', False),
+            mock.patch('services.chatbot.transform_chunk_tokens', budget),
+            mock.patch.object(StandInChatbot, '_complete', autospec=True, side_effect=echo_completion),
+        ):
+            self.addCleanup(patcher.stop)
+            self.complete = patcher.start()
+        self.bot = StandInChatbot()
+
+    def test_pages_are_grouped_up_to_the_budget(self):
+        self.assertEqual(split_pages(["a b", "c d", "e"], count_tokens("a b c d")), [["a b", "c d"], ["e"]])
+        long_page = "eigenvalue " * 50
+        self.assertEqual(split_pages(["a", long_page, "b"], 10), [["a"], [long_page], ["b"]])
+
+    def test_long_documents_are_transformed_in_page_aligned_parts(self):
+        document = self.bot.transform_document(self.pages, {"style": "summary"}, reconcile=False)
+
+        parts = ["\n".join(self.pages[i:i + 2]) for i in range(0, 6, 2)]
+        self.assertEqual(document, "\n\n".join(f"[{part}]" for part in parts))
+        prompts = sorted(call.kwargs["messages"][-1]["content"] for call in self.complete.call_args_list)
+        self.assertEqual([prompt.split(" of ")[0] for prompt in prompts], [f"Below is part {i}" for i in (1, 2, 3)])
+
+    def test_short_documents_take_one_call(self):
+        self.assertEqual(self.bot.transform_document(self.pages[:2], {"style": "summary"}), "[" + "\n".join(self.pages[:2]) + "]")
+        self.assertEqual(self.complete.call_count, 1)
+
+    def test_reconciliation_joins_the_parts_when_they_fit(self):
+        document = self.bot.transform_document(self.pages, {"style": "summary"}, max_tokens=4096, reconcile=True)
+        self.assertTrue(document.startswith("<[Page 1"))
+        self.assertEqual([call.args[1] for call in self.complete.call_args_list].count("transform_reconcile"), 1)
+
+        self.complete.reset_mock()
+        self.bot.transform_document(self.pages, {"style": "summary"}, max_tokens=50, reconcile=True)
+        self.assertNotIn("transform_reconcile", [call.args[1] for call in self.complete.call_args_list])
@@ -1,3 +1,83 @@
+from unittest import mock
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+from services.retrieval import HashingEmbedder, build_index
+from .models import UserSession, ChatSessions
 
 # Create your tests here.
+
+OCR_TEXT = "Eigenvalues are the scalars lambda for which Av = lambda v has a non-zero solution v."
+
+
+@mock.patch('user.chat.get_embedder', return_value=HashingEmbedder())
+class EndpointQueryCountTests(TestCase):
+    # Guards the hot endpoints against N+1 regressions; update the counts deliberately.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            self.session = UserSession.objects.create(
+                user=self.user,
+                session_name=f"Linear algebra {i}",
+                ocr_text=OCR_TEXT,
+                document_embeddings=build_index(OCR_TEXT, HashingEmbedder()),
+            )
+            self.chat_session = ChatSessions.objects.create(session=self.session)
+        for i in range(3):
+            self.chat_session.append_message(f"question {i}", f"answer {i}")
+
+    def test_session_list(self, _):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/user-sessions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_session_detail(self, _):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/user-sessions/{self.session.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_chat_history(self, _):
+        # chat session, chat history
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/user_sessions/{self.session.id}/chat-sessions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['chat_history']), 3)
+
+    @mock.patch('user.async_views.AzureChatbot')
+    def test_chat_turn(self, bot_class, _):
+        bot_class.return_value.arag_chatbot = mock.AsyncMock(return_value="Eigenvalues are scalars.")
+        # chat session + session, recent history, message append (savepoint, counter
+        # update, counter read, insert, release) and the returned chat history
+        with self.assertNumQueries(8):
+            response = self.client.put(
+                f'/api/user_sessions/{self.session.id}/chat-sessions/',
+                {'user_query': 'What are eigenvalues?', 'use_cache': False},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], "Eigenvalues are scalars.")
+
+
+class MetricsEndpointTests(TestCase):
+    url = '/api/metrics/'
+
+    @mock.patch('user.views.metrics_token', None)
+    def test_closed_until_a_token_is_configured(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer anything").status_code, 404)
+
+    @mock.patch('user.views.metrics_token', "scrape-token")
+    def test_requires_the_bearer_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong-token").status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="scrape-token").status_code, 401)
+
+    @mock.patch('user.views.metrics_token', "scrape-token")
+    def test_serves_the_prometheus_text_format(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn("# TYPE answer_cache_lookups_total counter", response.content.decode())
@@ -3,11 +3,19 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.generics import CreateAPIView
 from django.contrib.auth.models import User
-from .models import UserSession, ChatSessions
+from django.urls import reverse
+from .models import UserSession, SessionJob, SessionPage
+from .jobs import enqueue_session_job, retry_session_job
 from rest_framework.views import APIView
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
-from .serializers import RegisterSerializer, LoginSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer, UserProfileSerializer, UserSessionSerializer, UserSessionDetailSerializer, ChatSessionsSerializer
+from .serializers import RegisterSerializer, LoginSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer, UserProfileSerializer, UserSessionDetailSerializer, SessionJobSerializer, UserSessionListSerializer, UserSessionSearchResultSerializer, KeywordCountSerializer, SessionPageSerializer
+from .search import search_sessions, filter_by_keywords, keyword_counts
+from .pagination import UserSessionCursorPagination
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from config.config import metrics_token
+from services.metrics import render as render_metrics
 
 class RegisterView(CreateAPIView):
     queryset = User.objects.all()
@@ -78,17 +86,95 @@ class UserSessionView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, format=None):
-        user_sessions = UserSession.objects.filter(user=request.user)
-        serializer = UserSessionSerializer(user_sessions, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        user_sessions = UserSession.objects.filter(user=request.user).only(*UserSessionListSerializer.LIST_FIELDS)
+        keywords = request.query_params.get('keywords')
+        if keywords:
+            match = request.query_params.get('match', 'any')
+            if match not in ('any', 'all'):
+                return Response({"match": "Must be 'any' or 'all'."}, status=status.HTTP_400_BAD_REQUEST)
+            user_sessions = filter_by_keywords(user_sessions, keywords, match)
+        paginator = UserSessionCursorPagination()
+        page = paginator.paginate_queryset(user_sessions, request, view=self)
+        serializer = UserSessionListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, format=None):
-        serializer = UserSessionSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            user_session = serializer.save()
-            return Response(UserSessionSerializer(user_session).data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        pdf_public_url = request.data.get('pdf_public_url')
+        if not pdf_public_url:
+            return Response({"pdf_public_url": "This field is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = enqueue_session_job(request.user, pdf_public_url, request.data.get('specifications', {}))
+        return Response({
+            "job_id": job.id,
+            "status_url": request.build_absolute_uri(reverse('session-job-detail', args=[job.id])),
+            "job": SessionJobSerializer(job).data,
+        }, status=status.HTTP_202_ACCEPTED)
+
+class SessionJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        try:
+            job = SessionJob.objects.get(pk=pk, user=request.user)
+        except SessionJob.DoesNotExist:
+            return Response({"error": "Session job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(SessionJobSerializer(job).data, status=status.HTTP_200_OK)
+
+class SessionJobRetryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, format=None):
+        try:
+            job = SessionJob.objects.get(pk=pk, user=request.user)
+        except SessionJob.DoesNotExist:
+            return Response({"error": "Session job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not retry_session_job(job):
+            return Response({"error": "Only failed or stalled jobs can be retried."}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            "job_id": job.id,
+            "status_url": request.build_absolute_uri(reverse('session-job-detail', args=[job.id])),
+            "job": SessionJobSerializer(job).data,
+        }, status=status.HTTP_202_ACCEPTED)
     
+class UserSessionSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"q": "This query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_sessions(request.user, query)
+        serializer = UserSessionSearchResultSerializer(results, many=True, context={'request': request})
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+class KeywordListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        serializer = KeywordCountSerializer(keyword_counts(request.user), many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+class SessionPageListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, format=None):
+        if not UserSession.objects.filter(pk=pk, user=request.user).exists():
+            return Response({"error": "User session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        pages = SessionPage.objects.filter(session_id=pk)
+        # ?pages=2,5 reloads just those pages
+        requested = request.query_params.get('pages')
+        if requested:
+            try:
+                pages = pages.filter(page_number__in=[int(number) for number in requested.split(',') if number.strip()])
+            except ValueError:
+                return Response({"pages": "Must be a comma-separated list of page numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = SessionPageSerializer(pages, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
 class UserSessionDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -122,32 +208,15 @@ class UserSessionDetailView(APIView):
         user_session.delete()
         return Response({"message": "User session deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
     
-class ChatSessionsView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request, session_id, format=None):
-        try:
-            user_session = UserSession.objects.get(id=session_id, user=request.user)
-        except UserSession.DoesNotExist:
-            return Response({"error": "User session not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        chat_sessions = ChatSessions.objects.filter(session=user_session)
-        serializer = ChatSessionsSerializer(chat_sessions, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    def put(self, request, session_id, format=None):
-        try:
-            user_session = UserSession.objects.get(id=session_id, user=request.user)
-            chat_session = ChatSessions.objects.get(session=user_session)
-        except (UserSession.DoesNotExist, ChatSessions.DoesNotExist):
-            return Response({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+class MetricsView(APIView):
+    # Prometheus scrape target, authenticated by METRICS_TOKEN as a bearer token; it stays
+    # closed until the token is configured
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
-        request.data['session_id'] = session_id
-        serializer = ChatSessionsSerializer(chat_session, data=request.data, partial=True, context={'request': request})
-        if serializer.is_valid():
-            instance, extra = serializer.save()
-            return Response({
-                "chat_session": ChatSessionsSerializer(instance).data,
-                "response": extra["response"]
-            }, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, format=None):
+        if not metrics_token:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        if not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {metrics_token}"):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')